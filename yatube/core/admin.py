@@ -0,0 +1,24 @@
+"""Фоновые задачи в админке: состояние, ошибки и повторный запуск."""
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'task', 'queue', 'status', 'attempts', 'run_at', 'locked_by',
+    )
+    list_filter = ('queue', 'status')
+    search_fields = ('task',)
+    readonly_fields = ('created', 'locked_at', 'last_error')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(),
+            locked_by='',
+        )
+        self.message_user(request, f'Возвращено в очередь: {updated}')
+    retry.short_description = 'Запустить заново'
@@ -0,0 +1,265 @@
+"""Общий для всех процессов кэш поверх SQLite.
+
+LocMemCache живёт внутри одного процесса: при N воркерах gunicorn это
+N независимых кэшей, и сброс версии страницы в одном воркере не виден
+остальным. Этот бэкенд хранит данные в одном файле SQLite (режим WAL),
+поэтому работает на одной машине без внешних сервисов.
+
+Вытеснение — LRU: при чтении обновляется время обращения (не чаще раза
+в секунду на ключ), а при превышении MAX_ENTRIES или MAX_SIZE удаляются
+самые давно читавшиеся записи.
+
+Пример настроек::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+                'MAX_SIZE': 256 * 1024 * 1024,
+                'CULL_FREQUENCY': 4,
+            },
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+'''
+
+# Время обращения обновляется не чаще, чем раз в столько секунд:
+# так чтения почти никогда не превращаются в запись.
+TOUCH_GRANULARITY = 1.0
+
+# Проверка размера выполняется раз в столько записей.
+CHECK_EVERY = 64
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # Соединение своё у каждого потока и каждого процесса после fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self._path, timeout=30, isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _load(self, conn, key, now):
+        row = conn.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            conn.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now),
+            )
+            return None
+        if now - accessed > TOUCH_GRANULARITY:
+            conn.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key)
+            )
+        return value
+
+    def _store(self, conn, key, value, timeout):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        conn.execute(
+            'INSERT OR REPLACE INTO cache '
+            '(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+            (key, blob, self.get_backend_timeout(timeout), time.time(),
+             len(blob)),
+        )
+        self._writes += 1
+        if self._writes % CHECK_EVERY == 0:
+            self._cull(conn)
+
+    def _cull(self, conn):
+        now = time.time()
+        conn.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        entries, size = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        # Как и в Django: удаляем 1/CULL_FREQUENCY самых старых записей
+        limit = max(entries // self._cull_frequency, 1)
+        if size > self._max_size:
+            limit = max(limit, entries - entries * self._max_size // size)
+        conn.execute(
+            'DELETE FROM cache WHERE key IN '
+            '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (limit,),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if self._load(conn, key, time.time()) is not None:
+                return False
+            self._store(conn, key, value, timeout)
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        blob = self._load(self._connection(), key, time.time())
+        if blob is None:
+            return default
+        return pickle.loads(blob)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._store(self._connection(), key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._load(self._connection(), key, time.time()) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        conn = self._connection()
+        with conn:
+            # BEGIN IMMEDIATE сразу берёт блокировку записи, поэтому
+            # инкремент атомарен между процессами
+            conn.execute('BEGIN IMMEDIATE')
+            blob = self._load(conn, key, time.time())
+            if blob is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(blob) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            conn.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (blob, len(blob), key),
+            )
+        return value
+
+    def throttle(self, key, interval, burst, now=None, version=None):
+        """Шаг GCRA (ведро токенов) за одну транзакцию.
+
+        В ключе хранится «теоретическое время прибытия» следующего
+        запроса. Возвращает 0, если запрос пропущен, иначе — сколько
+        секунд ждать.
+        """
+        key = self._key(key, version)
+        now = time.time() if now is None else now
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            blob = self._load(conn, key, now)
+            arrival = max(pickle.loads(blob), now) if blob else now
+            arrival += interval
+            wait = arrival - now - burst * interval
+            if wait > 0:
+                return wait
+            # Запись живёт, пока ведро не наполнится снова
+            self._store(conn, key, arrival, arrival - now)
+        return 0
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        mapping = {self._key(key, version): key for key in keys}
+        conn = self._connection()
+        now = time.time()
+        rows = []
+        names = list(mapping)
+        # Старые сборки SQLite ограничивают число параметров 999
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            rows += conn.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({",".join("?" * len(chunk))})',
+                chunk,
+            ).fetchall()
+        found = {}
+        stale = []
+        for key, blob, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            found[mapping[key]] = pickle.loads(blob)
+            if now - accessed > TOUCH_GRANULARITY:
+                stale.append((now, key))
+        if stale:
+            conn.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale
+            )
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for key, value in data.items():
+                self._store(conn, self._key(key, version), value, timeout)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._connection().executemany(
+                'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединения переиспользуются между запросами: закрывать нечего
+        pass
@@ -0,0 +1,186 @@
+"""Очередь фоновых задач в базе, без внешнего брокера.
+
+Задача — функция, помеченная @task; enqueue записывает строку Job с
+путём к функции и аргументами (JSON) в текущей транзакции, поэтому
+задача появляется ровно тогда, когда зафиксированы данные, ради
+которых её поставили. Выполняет задачи manage.py run_workers.
+
+SQLite не знает SELECT ... FOR UPDATE, поэтому исполнитель сначала
+только читает id следующей готовой задачи, а затем захватывает её
+UPDATE с повторной проверкой состояния (status=queued): запись в SQLite
+последовательна, и два исполнителя не получат одну строку; проигравший
+берёт следующую.
+Неудачная попытка возвращает задачу в очередь с экспоненциальной
+задержкой, после max_attempts она остаётся в состоянии failed.
+Задачи зависшего исполнителя (locked_at старше JOB_TIMEOUT)
+возвращаются в очередь функцией recover, поэтому JOB_TIMEOUT должен
+быть больше времени самой долгой задачи: иначе её выполнит ещё и
+другой исполнитель. Результат записывает только тот, чей захват
+действует (locked_by).
+"""
+import json
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger('yatube.jobs')
+
+# Путь к функции -> (очередь, число попыток)
+TASKS = {}
+
+
+def task(queue='default', max_attempts=5):
+    """Регистрирует функцию как фоновую задачу."""
+    def decorator(func):
+        TASKS[f'{func.__module__}.{func.__qualname__}'] = (
+            queue, max_attempts
+        )
+        return func
+    return decorator
+
+
+def enqueue(func, *args, delay=0, **kwargs):
+    """Ставит вызов func(*args, **kwargs) в очередь; аргументы — JSON."""
+    name = f'{func.__module__}.{func.__qualname__}'
+    if name not in TASKS:
+        raise ValueError(f'{name} не помечена @task')
+    queue, max_attempts = TASKS[name]
+    return Job.objects.create(
+        queue=queue,
+        task=name,
+        payload=json.dumps({'args': args, 'kwargs': kwargs}),
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_once(func, *args, delay=0, **kwargs):
+    """Как enqueue, но не ставит дубль задачи, которая ещё ждёт в очереди.
+
+    Возвращает новую задачу или None, если такая уже стоит.
+    """
+    pending = Job.objects.filter(
+        task=f'{func.__module__}.{func.__qualname__}',
+        payload=json.dumps({'args': args, 'kwargs': kwargs}),
+        status=Job.QUEUED,
+    )
+    if pending.exists():
+        return None
+    return enqueue(func, *args, delay=delay, **kwargs)
+
+
+def claim(queue, worker):
+    """Захватывает следующую готовую задачу очереди или возвращает None.
+
+    Сначала только читает: простаивающий исполнитель опрашивает очередь
+    раз в JOB_POLL_INTERVAL и не должен каждый раз брать блокировку
+    записи SQLite. Если задачу перехватил другой исполнитель, берёт
+    следующую.
+    """
+    ready = Job.objects.filter(queue=queue, status=Job.QUEUED)
+    while True:
+        now = timezone.now()
+        candidate = ready.filter(run_at__lte=now).order_by(
+            'run_at', 'pk'
+        ).values_list('pk', flat=True).first()
+        if candidate is None:
+            return None
+        token = f'{worker}:{uuid.uuid4().hex}'
+        claimed = ready.filter(pk=candidate).update(
+            status=Job.RUNNING, locked_by=token, locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=candidate, locked_by=token)
+
+
+def backoff(attempts):
+    """Задержка перед повтором: растёт вдвое, с разбросом до 10%."""
+    delay = settings.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+    return delay * random.uniform(1, 1.1)
+
+
+def _finish(job, **changes):
+    # Только пока задача за нами: recover мог вернуть её в очередь, и
+    # теперь её выполняет и отметит другой исполнитель
+    finished = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by,
+    ).update(locked_by='', **changes)
+    if not finished:
+        logger.warning(
+            'Задача %s (%s) дольше JOB_TIMEOUT, её взял другой исполнитель',
+            job.pk, job.task,
+        )
+
+
+def perform(job):
+    """Выполняет захваченную задачу и записывает результат."""
+    try:
+        data = json.loads(job.payload)
+        import_string(job.task)(*data['args'], **data['kwargs'])
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Задача %s (%s) упала:\n%s', job.pk, job.task, error)
+        if job.attempts >= job.max_attempts:
+            changes = {'status': Job.FAILED}
+        else:
+            changes = {
+                'status': Job.QUEUED,
+                'run_at': timezone.now() + timedelta(
+                    seconds=backoff(job.attempts)
+                ),
+            }
+        _finish(job, last_error=error, **changes)
+        return False
+    _finish(job, status=Job.DONE)
+    return True
+
+
+def work(queue, worker, stop=None):
+    """Цикл исполнителя: берёт задачи, пока stop не установлен.
+
+    Без stop выходит, как только очередь опустеет. Возвращает число
+    выполненных задач.
+    """
+    done = 0
+    while stop is None or not stop.is_set():
+        job = claim(queue, worker)
+        if job is None:
+            if stop is None:
+                return done
+            stop.wait(settings.JOB_POLL_INTERVAL)
+            continue
+        perform(job)
+        done += 1
+    return done
+
+
+def recover():
+    """Возвращает в очередь задачи исполнителей, переставших отвечать."""
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT),
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_by='', last_error='Истекло время'
+    )
+    return stale.update(status=Job.QUEUED, locked_by='')
+
+
+def prune():
+    """Удаляет выполненные задачи старше JOB_KEEP_DONE секунд."""
+    return Job.objects.filter(
+        status=Job.DONE,
+        created__lt=timezone.now() - timedelta(
+            seconds=settings.JOB_KEEP_DONE
+        ),
+    ).delete()[0]
@@ -0,0 +1,54 @@
+"""Отправка писем через очередь фоновых задач.
+
+QueuedEmailBackend не ходит на почтовый сервер в запросе: каждое
+письмо сериализуется в отдельную задачу очереди mail, а исполнитель
+отправляет его бэкендом settings.QUEUED_EMAIL_BACKEND. Медленный или
+недоступный SMTP не задерживает ответ, а упавшая отправка повторяется
+с задержкой — только для этого письма, уже ушедшие не повторяются.
+
+Задачи, которые сами рассылают много писем (дайджесты уведомлений),
+берут delivery_connection и отправляют через одно соединение, отмечая
+каждое письмо сразу после отправки.
+"""
+import base64
+import pickle
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from . import jobs
+
+
+def delivery_connection(**kwargs):
+    """Соединение бэкенда, который действительно отправляет письма."""
+    backend = settings.EMAIL_BACKEND
+    if backend == f'{__name__}.{QueuedEmailBackend.__qualname__}':
+        backend = settings.QUEUED_EMAIL_BACKEND
+    return get_connection(backend, **kwargs)
+
+
+@jobs.task(queue='mail')
+def send_message(encoded):
+    message = pickle.loads(base64.b64decode(encoded))
+    message.connection = delivery_connection()
+    message.send()
+
+
+def encode(message):
+    # Письмо — объект с вложениями и заголовками: в JSON задачи он
+    # попадает как pickle в base64
+    message.connection = None
+    return base64.b64encode(pickle.dumps(message)).decode()
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Ставит каждое письмо в очередь mail отдельной задачей."""
+
+    def send_messages(self, email_messages):
+        sent = 0
+        for message in email_messages:
+            if message.recipients():
+                jobs.enqueue(send_message, encode(message))
+                sent += 1
+        return sent
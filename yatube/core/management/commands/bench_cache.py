@@ -0,0 +1,79 @@
+"""Сравнение бэкендов кэша под нагрузкой из нескольких процессов."""
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+
+
+def _worker(backend, location, ops, keys, value_size, seed, results):
+    cache = import_string(BACKENDS[backend])(
+        location, {'OPTIONS': {'MAX_ENTRIES': keys * 2}}
+    )
+    rng = random.Random(seed)
+    value = os.urandom(value_size)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(ops):
+        key = f'page:{rng.randrange(keys)}'
+        # Как у кэша страниц: промах приводит к записи
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, value, 3600)
+    results.put((ops, hits, time.perf_counter() - started))
+
+
+class Command(BaseCommand):
+    help = 'Замеряет пропускную способность и долю попаданий бэкендов кэша.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument('--value-size', type=int, default=16 * 1024)
+        parser.add_argument(
+            '--backend', action='append', choices=sorted(BACKENDS),
+            help='по умолчанию — все',
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        for backend in options['backend'] or list(BACKENDS):
+            tmp = tempfile.mkdtemp()
+            location = (
+                os.path.join(tmp, 'cache.sqlite3')
+                if backend == 'sqlite' else tmp
+            )
+            results = context.Queue()
+            workers = [
+                context.Process(target=_worker, args=(
+                    backend, location, options['ops'], options['keys'],
+                    options['value_size'], seed, results,
+                ))
+                for seed in range(options['processes'])
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            totals = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            wall = time.perf_counter() - started
+            shutil.rmtree(tmp, ignore_errors=True)
+            ops = sum(row[0] for row in totals)
+            hits = sum(row[1] for row in totals)
+            self.stdout.write(
+                f'{backend:<10} {ops / wall:>10.0f} оп/с  '
+                f'попаданий {hits / ops:6.1%}'
+            )
@@ -0,0 +1,162 @@
+"""Чтение и запись в SQLite из нескольких процессов: до и после прагм.
+
+default — как было: журнал отката, новое соединение на каждый запрос
+(CONN_MAX_AGE=0), таймаут ожидания блокировки sqlite3 по умолчанию.
+tuned — settings.SQLITE_PRAGMAS, но соединение по-прежнему новое на
+каждый запрос: разница с default — только от прагм.
+persistent — прагмы и одно соединение на процесс (CONN_MAX_AGE),
+показывает, сколько добавляет переиспользование соединения.
+
+Читатели выбирают страницу записей автора, писатели добавляют по одной
+записи в своей транзакции, как при комментарии или подписке.
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import sqlite
+
+SCHEMA = '''
+CREATE TABLE item (
+    id INTEGER PRIMARY KEY,
+    author INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX item_author ON item (author, id);
+'''
+AUTHORS = 1000
+TEXT = 'x' * 200
+
+
+MODES = ('default', 'tuned', 'persistent')
+
+
+def _connect(path, mode):
+    connection = sqlite3.connect(path, isolation_level=None)
+    if mode != 'default':
+        sqlite.apply(connection, settings.SQLITE_PRAGMAS)
+    return connection
+
+
+def _read(connection, rng):
+    connection.execute(
+        'SELECT id, text, created FROM item WHERE author = ? '
+        'ORDER BY id DESC LIMIT 10', (rng.randrange(AUTHORS),),
+    ).fetchall()
+
+
+def _write(connection, rng):
+    connection.execute('BEGIN')
+    try:
+        connection.execute(
+            'INSERT INTO item (author, text, created) VALUES (?, ?, ?)',
+            (rng.randrange(AUTHORS), TEXT, time.time()),
+        )
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def _worker(path, mode, role, duration, seed, results):
+    rng = random.Random(seed)
+    operation = _read if role == 'read' else _write
+    persistent = mode == 'persistent'
+    connection = _connect(path, mode) if persistent else None
+    ops = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if persistent:
+                operation(connection, rng)
+            else:
+                current = _connect(path, mode)
+                try:
+                    operation(current, rng)
+                finally:
+                    current.close()
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        ops += 1
+    results.put((role, ops, errors, latencies))
+
+
+def _prepare(path, mode, rows):
+    connection = _connect(path, mode)
+    if mode == 'default':
+        connection.execute('PRAGMA journal_mode = delete')
+    connection.executescript(SCHEMA)
+    rng = random.Random(0)
+    connection.execute('BEGIN')
+    connection.executemany(
+        'INSERT INTO item (author, text, created) VALUES (?, ?, ?)',
+        ((rng.randrange(AUTHORS), TEXT, time.time()) for _ in range(rows)),
+    )
+    connection.execute('COMMIT')
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность SQLite до и после прагм.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5.0)
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument(
+            '--mode', action='append', choices=MODES,
+            help='по умолчанию — все',
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        for mode in options['mode'] or MODES:
+            tmp = tempfile.mkdtemp()
+            path = os.path.join(tmp, 'bench.sqlite3')
+            _prepare(path, mode, options['rows'])
+            results = context.Queue()
+            roles = (
+                ['read'] * options['readers'] + ['write'] * options['writers']
+            )
+            workers = [
+                context.Process(target=_worker, args=(
+                    path, mode, role, options['duration'], seed, results,
+                ))
+                for seed, role in enumerate(roles)
+            ]
+            for worker in workers:
+                worker.start()
+            totals = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            shutil.rmtree(tmp, ignore_errors=True)
+            for role in ('read', 'write'):
+                rows = [row for row in totals if row[0] == role]
+                if not rows:
+                    continue
+                ops = sum(row[1] for row in rows)
+                errors = sum(row[2] for row in rows)
+                latencies = [value for row in rows for value in row[3]]
+                p99 = (
+                    statistics.quantiles(latencies, n=100)[98] * 1000
+                    if len(latencies) > 1 else 0
+                )
+                self.stdout.write(
+                    f'{mode:<10} {role:<6} '
+                    f"{ops / options['duration']:>9.0f} оп/с  "
+                    f'p99 {p99:>8.2f} мс  ошибок {errors}'
+                )
@@ -0,0 +1,100 @@
+"""Пул процессов, выполняющих фоновые задачи из core.jobs.
+
+Число процессов на очередь задаёт settings.JOB_QUEUES — это и есть
+ограничение параллельности очереди. Родительский процесс каждые
+SUPERVISE_INTERVAL секунд перезапускает упавших исполнителей, а раз в
+JOB_TIMEOUT возвращает в очередь зависшие задачи и чистит выполненные.
+SIGTERM и Ctrl+C останавливают пул после текущих задач.
+"""
+import multiprocessing
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import jobs
+
+SUPERVISE_INTERVAL = 5
+
+
+def _worker(queue, stop):
+    # После fork соединения родителя не годятся: каждый открывает своё
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    name = f'{os.uname().nodename}:{os.getpid()}'
+    try:
+        jobs.work(queue, name, stop)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Запускает исполнителей фоновых задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help='очередь (можно несколько раз); по умолчанию — все',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='выполнить готовые задачи в этом процессе и выйти',
+        )
+
+    def handle(self, *args, **options):
+        queues = options['queues'] or list(settings.JOB_QUEUES)
+        unknown = set(queues) - set(settings.JOB_QUEUES)
+        if unknown:
+            raise CommandError(f'Нет таких очередей: {", ".join(unknown)}')
+        if options['burst']:
+            jobs.recover()
+            for queue in queues:
+                done = jobs.work(queue, f'burst:{os.getpid()}')
+                self.stdout.write(f'{queue}: выполнено задач {done}')
+            return
+        self.run_pool(queues)
+
+    def run_pool(self, queues):
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        slots = [
+            queue for queue in queues
+            for _ in range(settings.JOB_QUEUES[queue])
+        ]
+        processes = [None] * len(slots)
+        self.stdout.write(
+            'Исполнители: ' + ', '.join(
+                f'{queue}×{settings.JOB_QUEUES[queue]}' for queue in queues
+            )
+        )
+        maintained = 0
+        try:
+            while not stop.is_set():
+                for index, queue in enumerate(slots):
+                    process = processes[index]
+                    if process is None or not process.is_alive():
+                        if process is not None:
+                            self.stderr.write(
+                                f'{queue}: исполнитель {process.pid} '
+                                f'завершился с кодом {process.exitcode}'
+                            )
+                        connections.close_all()
+                        process = context.Process(
+                            target=_worker, args=(queue, stop), daemon=True,
+                        )
+                        process.start()
+                        processes[index] = process
+                if time.monotonic() - maintained >= settings.JOB_TIMEOUT:
+                    jobs.recover()
+                    jobs.prune()
+                    maintained = time.monotonic()
+                stop.wait(SUPERVISE_INTERVAL)
+        except KeyboardInterrupt:
+            stop.set()
+        for process in processes:
+            if process is not None:
+                process.join()
+        self.stdout.write('Исполнители остановлены.')
@@ -0,0 +1,52 @@
+"""Копирует основную базу SQLite в файлы реплик.
+
+Локальная замена репликации для проверки ReplicaRouter::
+
+    export YATUBE_DATABASE_REPLICAS=/tmp/replica-0.sqlite3,/tmp/replica-1.sqlite3
+    python manage.py sync_replicas --interval 2 &
+    python manage.py runserver
+
+Копия делается через backup API SQLite, поэтому основную базу можно
+не останавливать.
+"""
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def sync(source, target):
+    primary = sqlite3.connect(source)
+    replica = sqlite3.connect(target)
+    try:
+        primary.backup(replica)
+    finally:
+        replica.close()
+        primary.close()
+
+
+class Command(BaseCommand):
+    help = 'Обновляет реплики копией основной базы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='повторять каждые N секунд, пока не прервут',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы: YATUBE_DATABASE_REPLICAS.')
+        source = settings.DATABASES['default']['NAME']
+        while True:
+            started = time.perf_counter()
+            for alias in settings.DATABASE_REPLICAS:
+                sync(source, settings.DATABASES[alias]['NAME'])
+            self.stdout.write(
+                f'Реплик обновлено: {len(settings.DATABASE_REPLICAS)} '
+                f'за {time.perf_counter() - started:.2f} с'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
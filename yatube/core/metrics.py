@@ -0,0 +1,233 @@
+"""Метрики производительности запросов в формате Prometheus.
+
+MetricsMiddleware замеряет каждый запрос и раскладывает результат по
+имени маршрута (posts:index, posts:post_detail, ...): общее время,
+число и время SQL-запросов, время отрисовки шаблонов, события кэша
+страниц. Данные копятся в гистограммах в памяти процесса и отдаются
+view metrics в текстовом формате Prometheus.
+
+Накладные расходы — несколько вызовов perf_counter и одна блокировка
+на наблюдение, поэтому middleware можно держать включённым в бою.
+Каждый воркер считает свои метрики; Prometheus складывает их сам,
+если опрашивать воркеры по отдельности (или видит один случайный
+воркер за балансировщиком).
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+# Границы корзин в секундах: от 1 мс до 10 с
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_local = threading.local()
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> [счётчики корзин (без накопления), сумма, количество]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0
+                ]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._series.items()
+            }
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            bounds = [*map(_number, self.buckets), '+Inf']
+            for bound, bucket in zip(bounds, counts):
+                cumulative += bucket
+                labels = _labels(key + (('le', bound),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_sum{_labels(key)} {_number(total)}'
+            yield f'{self.name}_count{_labels(key)} {count}'
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._series = defaultdict(int)
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] += value
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            series = dict(self._series)
+        for key, value in sorted(series.items()):
+            yield f'{self.name}{_labels(key)} {value}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    inner = ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return '{' + inner + '}'
+
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds',
+    'Время обработки запроса.', DURATION_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'yatube_db_queries_per_request',
+    'Число SQL-запросов за запрос.', COUNT_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'yatube_db_duration_seconds',
+    'Суммарное время SQL-запросов за запрос.', DURATION_BUCKETS,
+)
+TEMPLATE_DURATION = Histogram(
+    'yatube_template_duration_seconds',
+    'Время отрисовки шаблонов за запрос.', DURATION_BUCKETS,
+)
+RESPONSES = Counter(
+    'yatube_responses_total', 'Ответы по маршрутам и кодам.',
+)
+EVENTS = Counter(
+    'yatube_events_total',
+    'События за запрос: попадания и промахи кэша страниц и т. п.',
+)
+
+METRICS = (
+    REQUEST_DURATION, DB_QUERIES, DB_DURATION, TEMPLATE_DURATION,
+    RESPONSES, EVENTS,
+)
+
+
+class _Collector:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.events = defaultdict(int)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def incr(event, value=1):
+    """Отмечает событие в текущем запросе (вне запроса ничего не делает)."""
+    collector = getattr(_local, 'collector', None)
+    if collector is not None:
+        collector.events[event] += value
+
+
+def expose():
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = _local.collector = _Collector()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(collector))
+                response = self.get_response(request)
+        finally:
+            _local.collector = None
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        REQUEST_DURATION.observe(duration, view=view)
+        DB_QUERIES.observe(collector.queries, view=view)
+        DB_DURATION.observe(collector.db_time, view=view)
+        TEMPLATE_DURATION.observe(collector.template_time, view=view)
+        RESPONSES.inc(view=view, status=response.status_code)
+        for event, value in collector.events.items():
+            EVENTS.inc(value, view=view, event=event)
+        return response
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        collector = getattr(_local, 'collector', None)
+        if collector is None:
+            return self.template.render(context, request)
+        # Вложенные render (render_to_string из тегов) уже внутри замера
+        collector.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            collector.template_depth -= 1
+            if not collector.template_depth:
+                collector.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, замеряющий время отрисовки."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,44 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди (core/jobs.py)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    queue = models.CharField('Очередь', max_length=50, default='default')
+    task = models.CharField('Функция', max_length=200)
+    payload = models.TextField('Аргументы (JSON)', default='{}')
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток', default=5
+    )
+    run_at = models.DateTimeField('Запустить не раньше', default=timezone.now)
+    locked_by = models.CharField('Исполнитель', max_length=100, blank=True)
+    locked_at = models.DateTimeField('Взята в работу', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=['queue', 'status', 'run_at'], name='job_claim_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} [{self.queue}] {self.status}'
@@ -0,0 +1,65 @@
+"""Бюджет SQL-запросов на view.
+
+Декоратор query_budget объявляет, сколько запросов к базе может сделать
+view за один вызов. Бюджет хранится на функции view (его читают тесты),
+а в режиме DEBUG превышение ещё и пишется в лог.
+"""
+import logging
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('yatube.query_budget')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """View сделал больше запросов, чем объявлено."""
+
+
+@contextmanager
+def capture_queries():
+    """Собирает SQL всех запросов внутри блока в список (все базы)."""
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        statements.append(sql)
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record))
+        yield statements
+
+
+@contextmanager
+def assert_max_queries(limit, label='block'):
+    """Падает, если внутри блока выполнено больше limit запросов."""
+    with capture_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        raise QueryBudgetExceeded(
+            f'{label}: {len(statements)} запросов при бюджете {limit}\n'
+            + '\n'.join(statements)
+        )
+
+
+def query_budget(limit):
+    """Объявляет бюджет запросов для view."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not settings.DEBUG:
+                return view_func(request, *args, **kwargs)
+            with capture_queries() as statements:
+                response = view_func(request, *args, **kwargs)
+            if len(statements) > limit:
+                logger.warning(
+                    '%s: %d запросов при бюджете %d',
+                    view_func.__name__, len(statements), limit,
+                )
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
@@ -0,0 +1,74 @@
+"""Ограничение частоты запросов к пишущим view.
+
+Ведро токенов на пользователя (или IP для анонимов) и view: rate
+'20/m' — ведро на 20 запросов, которое полностью наполняется за
+минуту. Состояние ведра — одно число в кэше (алгоритм GCRA), и
+SQLiteCache проверяет и обновляет его за одно обращение (throttle).
+Лишний запрос получает 429 с Retry-After до того, как view что-либо
+запишет в базу.
+
+Лимиты задаются в settings.RATE_LIMITS по имени области;
+области нет в настройках — ограничения нет.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import metrics
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """'20/m' -> (20, 60)."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def _throttle(key, interval, burst):
+    if hasattr(cache, 'throttle'):
+        return cache.throttle(key, interval, burst)
+    # Прочие бэкенды: тот же алгоритм, но чтение и запись раздельно
+    now = time.time()
+    arrival = max(cache.get(key, now), now) + interval
+    wait = arrival - now - burst * interval
+    if wait > 0:
+        return wait
+    cache.set(key, arrival, arrival - now)
+    return 0
+
+
+def client_id(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def rate_limit(scope, methods=('POST',)):
+    """Ограничивает view лимитом settings.RATE_LIMITS[scope]."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            rate = getattr(settings, 'RATE_LIMITS', {}).get(scope)
+            if rate is None or request.method not in methods:
+                return view_func(request, *args, **kwargs)
+            count, period = parse_rate(rate)
+            wait = _throttle(
+                f'ratelimit:{scope}:{client_id(request)}',
+                period / count, count,
+            )
+            if not wait:
+                return view_func(request, *args, **kwargs)
+            metrics.incr(f'rate_limited_{scope}')
+            response = HttpResponse(
+                'Слишком много запросов, попробуйте позже.',
+                status=429, content_type='text/plain; charset=utf-8',
+            )
+            response['Retry-After'] = str(math.ceil(wait))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,83 @@
+"""Чтение с реплик базы для лент и страницы поста.
+
+Декоратор read_replica помечает view, которые только читают: на время
+такого GET-запроса ReplicaRouter отдаёт чтения одной случайно выбранной
+реплике из settings.DATABASE_REPLICAS. Все записи, а также чтения вне
+помеченных view (формы, команды, фоновые потоки) идут в основную базу.
+
+Реплика отстаёт от основной базы, поэтому после любого запроса,
+меняющего данные, клиент получает cookie на REPLICA_PIN_SECONDS, и до
+его истечения его чтения тоже идут в основную базу: автор сразу видит
+свой пост и комментарий. Остальные читатели в это окно могут увидеть
+старую версию, поэтому страница, прочитанная с реплики, не попадает в
+кэш страниц и не получает ETag, если её области менялись за последние
+REPLICA_PIN_SECONDS (posts/cache.py). Окно должно быть больше
+отставания реплик.
+"""
+import random
+import threading
+from functools import wraps
+
+from django.conf import settings
+
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_local = threading.local()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return getattr(_local, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def on_replica():
+    """Читает ли текущий запрос с реплики."""
+    return getattr(_local, 'alias', None) is not None
+
+
+def pinned(request):
+    return (
+        request.method not in SAFE_METHODS
+        or PIN_COOKIE in request.COOKIES
+    )
+
+
+def read_replica(view_func):
+    """Направляет чтения view на реплику, если клиент не закреплён."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not settings.DATABASE_REPLICAS or pinned(request):
+            return view_func(request, *args, **kwargs)
+        _local.alias = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _local.alias = None
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет клиента за основной базой после записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
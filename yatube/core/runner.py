@@ -0,0 +1,39 @@
+"""Запуск тестов со своим кэшем.
+
+Кэш по умолчанию — файл SQLite рядом с проектом, общий с запущенным
+сервером. Тесты очищают кэш и кладут в него страницы, версии и лимиты,
+поэтому на время прогона кэш переносится во временный файл: тесты не
+стирают кэш сервера, а он не подмешивает в тесты свои данные.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+SQLITE_CACHE = 'core.cache.SQLiteCache'
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix='yatube-test-cache-')
+        default = settings.CACHES['default']
+        if default['BACKEND'] == SQLITE_CACHE:
+            cache = {
+                **default,
+                'LOCATION': os.path.join(self._cache_dir, 'cache.sqlite3'),
+            }
+        else:
+            cache = {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }
+        self._cache_override = override_settings(CACHES={'default': cache})
+        self._cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_override.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,28 @@
+"""Боевой режим SQLite: WAL и прагмы на каждом соединении.
+
+В режиме отката (journal_mode=delete) писатель блокирует весь файл, и
+читатели ждут конца каждой записи комментария или подписки; при
+нескольких воркерах это заканчивается «database is locked». В режиме
+WAL читатели не мешают писателю и наоборот, а synchronous=normal
+сбрасывает журнал на диск только на контрольных точках.
+
+Прагмы берутся из settings.SQLITE_PRAGMAS и выполняются по сигналу
+connection_created, то есть один раз на соединение, и только в боевом
+режиме (SQLITE_PRODUCTION); в нём же CONN_MAX_AGE оставляет соединение
+жить между запросами.
+"""
+from django.conf import settings
+
+
+def apply(connection, pragmas):
+    """Выполняет прагмы на соединении sqlite3."""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def configure(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRODUCTION:
+        return
+    # Напрямую через sqlite3: эти запросы не должны попадать в счётчики
+    # запросов страницы
+    apply(connection.connection, getattr(settings, 'SQLITE_PRAGMAS', {}))
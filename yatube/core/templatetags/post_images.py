@@ -0,0 +1,13 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def cached_thumbnail(image, alias='card'):
+    """Готовая миниатюра или None: сама миниатюра в запросе не строится."""
+    if not image:
+        return None
+    return thumbnails.lookup(image, alias)
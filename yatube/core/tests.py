@@ -0,0 +1,354 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import jobs
+from core.cache import SQLiteCache
+from core.metrics import Histogram
+from core.models import Job
+from core.replicas import (PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter,
+                           read_replica)
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self.tmp.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_basic_operations(self):
+        """Базовые операции ведут себя как у LocMemCache."""
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.assertEqual(
+            self.cache.get_many(['key', 'new', 'missing']),
+            {'key': {'a': 1}, 'new': 'value'},
+        )
+        self.cache.set('n', 1)
+        self.assertEqual(self.cache.incr('n', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete_many(['key', 'new'])
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('n'))
+
+    def test_expiry(self):
+        """Просроченные записи не возвращаются."""
+        self.cache.set('short', 'value', timeout=0.01)
+        self.cache.set('forever', 'value', timeout=None)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2},
+        })
+        cache.set('hot', 'value')
+        for i in range(200):
+            # Чтение освежает время обращения к 'hot'
+            cache._connection().execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                (time.time() + 100, cache.make_key('hot')),
+            )
+            cache.set(f'cold{i}', 'value')
+        entries = cache._connection().execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+        self.assertLess(entries, 200)
+        self.assertEqual(cache.get('hot'), 'value')
+
+    def test_throttle_is_token_bucket(self):
+        """Ведро на 3 запроса пропускает 3 подряд и наполняется со временем."""
+        waits = [self.cache.throttle('bucket', 1.0, 3, now=100)
+                 for _ in range(4)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertAlmostEqual(waits[3], 1.0)
+        self.assertEqual(self.cache.throttle('bucket', 1.0, 3, now=101), 0)
+        self.assertGreater(self.cache.throttle('bucket', 1.0, 3, now=101), 0)
+
+    def test_shared_between_processes(self):
+        """Процессы видят один кэш, incr атомарен."""
+        self.cache.set('counter', 0, timeout=None)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def connect(self):
+        return DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(self.tmp.name, 'db.sqlite3'),
+        }, alias='pragmas')
+
+    @override_settings(SQLITE_PRODUCTION=True)
+    def test_new_connection_gets_pragmas(self):
+        """Новое соединение переводится в WAL и получает прагмы."""
+        wrapper = self.connect()
+        with wrapper.cursor() as cursor:
+            for name, expected in (
+                ('journal_mode', 'wal'),
+                ('synchronous', 1),
+                ('busy_timeout', 5000),
+            ):
+                with self.subTest(pragma=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+        wrapper.close()
+
+    @override_settings(SQLITE_PRODUCTION=False)
+    def test_pragmas_only_in_production(self):
+        wrapper = self.connect()
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'delete')
+        wrapper.close()
+
+    def test_benchmark_reports_all_modes(self):
+        out = StringIO()
+        call_command(
+            'bench_sqlite', duration=0.2, rows=100, readers=1, writers=1,
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            [line.split()[:2] for line in lines],
+            [['default', 'read'], ['default', 'write'],
+             ['tuned', 'read'], ['tuned', 'write'],
+             ['persistent', 'read'], ['persistent', 'write']],
+        )
+
+
+@read_replica
+def _read_alias(request):
+    return HttpResponse(ReplicaRouter().db_for_read(None) or 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_reads_go_to_replica(self):
+        response = _read_alias(self.factory.get('/'))
+        self.assertEqual(response.content, b'replica_0')
+        self.assertIsNone(ReplicaRouter().db_for_read(None))
+
+    def test_pinned_client_reads_primary(self):
+        """После записи клиент какое-то время читает из основной базы."""
+        middleware = ReplicaPinMiddleware(lambda request: HttpResponse())
+        response = middleware(self.factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(_read_alias(request).content, b'default')
+
+    def test_failed_write_does_not_pin(self):
+        middleware = ReplicaPinMiddleware(
+            lambda request: HttpResponse(status=403)
+        )
+        response = middleware(self.factory.post('/'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_writes_and_migrations_stay_on_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(None), 'default')
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+        self.assertFalse(router.allow_migrate('replica_0', 'posts'))
+
+
+class MetricsTests(TestCase):
+    def test_histogram_exposition(self):
+        histogram = Histogram('test_seconds', 'Тест.', (0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view='a"b')
+        self.assertEqual(list(histogram.expose()), [
+            '# HELP test_seconds Тест.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{view="a\\"b",le="1"} 2',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 3',
+            'test_seconds_sum{view="a\\"b"} 5.55',
+            'test_seconds_count{view="a\\"b"} 3',
+        ])
+
+    def test_requests_are_measured_per_view(self):
+        cache.clear()
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        view = 'view="posts:index"'
+        for line in (
+            f'yatube_request_duration_seconds_count{{{view}}}',
+            f'yatube_db_queries_per_request_count{{{view}}}',
+            f'yatube_template_duration_seconds_count{{{view}}}',
+            f'yatube_responses_total{{status="200",{view}}}',
+            f'yatube_events_total{{event="page_cache_hits",{view}}}',
+            f'yatube_events_total{{event="page_cache_misses",{view}}}',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, body)
+
+    def test_metrics_are_internal(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='203.0.113.5'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_hidden_behind_proxy(self):
+        """Через локальный прокси REMOTE_ADDR — loopback, но это не свой."""
+        response = self.client.get(
+            reverse('metrics'), HTTP_X_FORWARDED_FOR='203.0.113.5'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer secret',
+            HTTP_X_FORWARDED_FOR='203.0.113.5',
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+CALLS = []
+
+
+@jobs.task(max_attempts=2)
+def record(value, fail=False):
+    CALLS.append(value)
+    if fail:
+        raise RuntimeError('не вышло')
+
+
+@override_settings(JOB_RETRY_DELAY=60)
+class JobTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_job_runs_once(self):
+        job = jobs.enqueue(record, 'a')
+        claimed = jobs.claim('default', 'test')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(jobs.claim('default', 'test'))
+        self.assertTrue(jobs.perform(claimed))
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, Job.DONE)
+        self.assertEqual(CALLS, ['a'])
+
+    def test_idle_claim_only_reads(self):
+        jobs.enqueue(record, 'later', delay=60)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNone(jobs.claim('default', 'test'))
+        self.assertEqual(
+            [query['sql'].split()[0] for query in queries], ['SELECT']
+        )
+
+    def test_failed_job_retried_with_backoff(self):
+        job = jobs.enqueue(record, 'b', fail=True)
+        started = timezone.now()
+        with self.assertLogs('yatube.jobs', 'WARNING'):
+            self.assertFalse(jobs.perform(jobs.claim('default', 'test')))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreaterEqual(job.run_at, started + timedelta(seconds=60))
+        self.assertIn('не вышло', job.last_error)
+        # До срока повтора задача не выдаётся
+        self.assertIsNone(jobs.claim('default', 'test'))
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('yatube.jobs', 'WARNING'):
+            jobs.perform(jobs.claim('default', 'test'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(CALLS, ['b', 'b'])
+
+    def test_recovered_job_not_finished_by_old_worker(self):
+        """Исполнитель, у которого задачу забрали, не пишет результат."""
+        jobs.enqueue(record, 'd')
+        old = jobs.claim('default', 'slow')
+        Job.objects.filter(pk=old.pk).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+        jobs.recover()
+        new = jobs.claim('default', 'fresh')
+        with self.assertLogs('yatube.jobs', 'WARNING'):
+            jobs.perform(old)
+        new.refresh_from_db()
+        self.assertEqual(new.status, Job.RUNNING)
+        self.assertTrue(new.locked_by.startswith('fresh:'))
+        jobs.perform(new)
+        new.refresh_from_db()
+        self.assertEqual(new.status, Job.DONE)
+
+    def test_stale_job_recovered(self):
+        job = jobs.enqueue(record, 'c')
+        jobs.claim('default', 'lost')
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(jobs.recover(), 1)
+        call_command('run_workers', burst=True, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(CALLS, ['c'])
+
+    @override_settings(
+        EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+        QUEUED_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    )
+    def test_mail_sent_by_worker(self):
+        """Каждое письмо — своя задача: повтор не шлёт соседние."""
+        mail.send_mass_mail([
+            ('Тема', 'Текст', 'from@yatube.ru', ['to@yatube.ru']),
+            ('Другая', 'Текст', 'from@yatube.ru', ['other@yatube.ru']),
+        ])
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Job.objects.filter(queue='mail').count(), 2)
+        call_command(
+            'run_workers', queues=['mail'], burst=True, stdout=StringIO()
+        )
+        self.assertEqual(
+            [message.subject for message in mail.outbox], ['Тема', 'Другая']
+        )
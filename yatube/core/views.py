@@ -1,7 +1,41 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from core import metrics as core_metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
 
 def csrf_failure(request, reason=''):
-    return render(request, 'core/403csrf.html')
\ No newline at end of file
+    return render(request, 'core/403csrf.html')
+
+
+# Заголовки, которые ставит обратный прокси: такой запрос пришёл снаружи,
+# даже если REMOTE_ADDR — адрес самого прокси на этой машине
+PROXY_HEADERS = ('HTTP_X_FORWARDED_FOR', 'HTTP_X_REAL_IP', 'HTTP_FORWARDED')
+
+
+def metrics_allowed(request):
+    """С токеном METRICS_TOKEN — только по нему, без — прямые локальные."""
+    if settings.METRICS_TOKEN:
+        return constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            f'Bearer {settings.METRICS_TOKEN}',
+        )
+    return (
+        request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+        and not any(header in request.META for header in PROXY_HEADERS)
+    )
+
+
+def metrics(request):
+    """Метрики для Prometheus; доступны только внутренним клиентам."""
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(
+        core_metrics.expose(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,6 +1,7 @@
 """Создаём интерфейс админ зоны сайта."""
 from django.contrib import admin
 
+from posts import search
 from posts.models import Group, Post
 from yatube.settings import EMPTY_VALUE_DISPLAY
 
@@ -21,5 +22,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = EMPTY_VALUE_DISPLAY
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу вместо LIKE '%...%'."""
+        query = search.build_query(search_term)
+        if not query:
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(query)), False
+
 
 admin.site.register(Group)
@@ -0,0 +1,259 @@
+"""JSON API только для чтения: /api/v1/.
+
+Ответы собираются из строк .values(), без моделей и шаблонов.
+?fields=id,text оставляет в ответе только перечисленные поля (и в
+запрос к базе идут только их столбцы), ?cursor= — курсор следующей
+или предыдущей страницы из полей next и previous. Кэш и ETag — те же,
+что у HTML-страниц, с теми же областями, поэтому изменение поста
+сбрасывает и страницу, и ответ API.
+"""
+from datetime import datetime
+from functools import wraps
+
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+
+from core.query_budget import query_budget
+from core.replicas import read_replica
+
+from .cache import (conditional_page, group_scope, index_scope,
+                    post_detail_scopes, post_scope, profile_scope,
+                    versioned_cache_page)
+from .models import Comment, Group, Post, Timeline, User
+from .paginator import paginate
+from yatube.settings import COMMENTS_PER_PAGE, COUNT_POST_FOR_PAGE
+
+# Имя поля в ответе -> путь для .values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+# Число комментариев — только у поста: комментарий сбрасывает область
+# поста, а не кэш лент, где лежат списки
+POST_DETAIL_FIELDS = {
+    **POST_FIELDS,
+    'comments_count': 'comments_count',
+}
+# Лента подписок читается из Timeline: дата и id — её собственные столбцы
+TIMELINE_FIELDS = {
+    **{name: f'post__{path}' for name, path in POST_FIELDS.items()},
+    'id': 'post_id',
+    'pub_date': 'pub_date',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+}
+GROUP_FIELDS = {
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+    'posts_count': 'posts_count',
+}
+PROFILE_FIELDS = {
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'posts_count': 'stats__posts_count',
+    'followers_count': 'stats__followers_count',
+    'following_count': 'stats__following_count',
+}
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view_func):
+    """Ошибки view — JSON с кодом ответа, а не HTML-страница."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except Http404:
+            return _json({'error': 'Не найдено.'}, status=404)
+        except ApiError as error:
+            return _json({'error': str(error)}, status=error.status)
+    return wrapper
+
+
+def requested_fields(request, spec):
+    """Имена полей из ?fields= (по умолчанию все) в порядке spec."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(spec)
+    names = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = names - spec.keys()
+    if unknown:
+        raise ApiError(
+            'Неизвестные поля: ' + ', '.join(sorted(unknown))
+            + '. Доступны: ' + ', '.join(spec)
+        )
+    return [name for name in spec if name in names]
+
+
+def _value(path, value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if path.endswith('image'):
+        return default_storage.url(value) if value else None
+    if path.startswith('stats__') and value is None:
+        # Нет строки счётчиков — значит, всё по нулям
+        return 0
+    return value
+
+
+def serialize(row, names, spec):
+    return {name: _value(spec[name], row[spec[name]]) for name in names}
+
+
+def _object(queryset, request, spec):
+    names = requested_fields(request, spec)
+    row = queryset.values(*(spec[name] for name in names)).first()
+    if row is None:
+        raise Http404
+    return _json(serialize(row, names, spec))
+
+
+def _page(queryset, request, spec, per_page=COUNT_POST_FOR_PAGE,
+          field='pub_date', pk_field='id'):
+    names = requested_fields(request, spec)
+    # Столбцы курсора нужны всегда, даже если их нет в ?fields=
+    paths = {spec[name] for name in names} | {field, pk_field}
+    page = paginate(
+        request, queryset.values(*paths), per_page,
+        field=field, pk_field=pk_field,
+    )
+    return _json({
+        'results': [serialize(row, names, spec) for row in page],
+        'next': page.next_cursor(),
+        'previous': page.previous_cursor(),
+    })
+
+
+@read_replica
+@conditional_page(lambda: [index_scope()])
+@versioned_cache_page(lambda: [index_scope()])
+@query_budget(3)
+@api_view
+def post_list(request):
+    return _page(Post.objects.all(), request, POST_FIELDS)
+
+
+@read_replica
+@conditional_page(post_detail_scopes)
+@versioned_cache_page(post_detail_scopes)
+@query_budget(5)
+@api_view
+def post_detail(request, post_id):
+    return _object(
+        Post.objects.filter(pk=post_id), request, POST_DETAIL_FIELDS
+    )
+
+
+@read_replica
+@conditional_page(lambda post_id: [post_scope(post_id)])
+@versioned_cache_page(lambda post_id: [post_scope(post_id)])
+@query_budget(4)
+@api_view
+def comment_list(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return _page(
+        Comment.objects.filter(post_id=post_id), request, COMMENT_FIELDS,
+        COMMENTS_PER_PAGE, field='created',
+    )
+
+
+@read_replica
+@conditional_page(lambda: [index_scope()])
+@versioned_cache_page(lambda: [index_scope()])
+@query_budget(3)
+@api_view
+def group_list(request):
+    names = requested_fields(request, GROUP_FIELDS)
+    rows = Group.objects.order_by('title').values(
+        *(GROUP_FIELDS[name] for name in names)
+    )
+    return _json({
+        'results': [serialize(row, names, GROUP_FIELDS) for row in rows],
+    })
+
+
+@read_replica
+@conditional_page(lambda slug: [group_scope(slug)])
+@versioned_cache_page(lambda slug: [group_scope(slug)])
+@query_budget(3)
+@api_view
+def group_detail(request, slug):
+    return _object(Group.objects.filter(slug=slug), request, GROUP_FIELDS)
+
+
+@read_replica
+@conditional_page(lambda slug: [group_scope(slug)])
+@versioned_cache_page(lambda slug: [group_scope(slug)])
+@query_budget(4)
+@api_view
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        raise Http404
+    return _page(
+        Post.objects.filter(group_id=group_id), request, POST_FIELDS
+    )
+
+
+@read_replica
+@conditional_page(lambda username: [profile_scope(username)])
+@versioned_cache_page(lambda username: [profile_scope(username)])
+@query_budget(3)
+@api_view
+def profile_detail(request, username):
+    return _object(
+        User.objects.filter(username=username), request, PROFILE_FIELDS
+    )
+
+
+@read_replica
+@conditional_page(lambda username: [profile_scope(username)])
+@versioned_cache_page(lambda username: [profile_scope(username)])
+@query_budget(4)
+@api_view
+def profile_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        raise Http404
+    return _page(
+        Post.objects.filter(author_id=author_id), request, POST_FIELDS
+    )
+
+
+@read_replica
+@query_budget(3)
+@api_view
+def follow_feed(request):
+    # Лента своя у каждого пользователя и, как и HTML, не кэшируется
+    if not request.user.is_authenticated:
+        raise ApiError('Нужна авторизация.', status=401)
+    return _page(
+        Timeline.objects.filter(user=request.user), request,
+        TIMELINE_FIELDS, field='pub_date', pk_field='post_id',
+    )
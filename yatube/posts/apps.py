@@ -1,5 +1,24 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_migrate
+
+SEARCH_MIGRATION = ('posts', '0008_post_search')
+
+
+def install_search(using, **kwargs):
+    # Миграции, пересоздающие posts_post, удаляют триггеры индекса.
+    # До 0008 (или после её отката) индекса быть не должно, а таблицы
+    # постов может ещё не быть вовсе
+    from . import search
+    connection = connections[using]
+    if SEARCH_MIGRATION in MigrationRecorder(connection).applied_migrations():
+        search.install(connection)
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search, sender=self)
@@ -0,0 +1,229 @@
+"""Кэш страниц с версионными ключами.
+
+Каждая страница зависит от набора «областей» (лента, группа, профиль,
+пост). У области в кэше хранится номер версии; ключ страницы содержит
+версии всех её областей. Сигналы моделей увеличивают версию затронутых
+областей, и старые копии страниц просто перестают находиться, поэтому
+время жизни кэша можно держать большим.
+
+Те же версии служат валидатором для условных GET: ETag страницы
+считается из ключа, и клиент с актуальным ETag получает 304 без
+отрисовки шаблона.
+
+С репликами (core/replicas.py) версия растёт сразу, а реплика может ещё
+не получить запись: страница, собранная по старым данным, легла бы под
+новую версию до следующей записи. Поэтому сброс области оставляет
+отметку на REPLICA_PIN_SECONDS, и пока она жива, страница с реплики не
+кэшируется и не получает ETag.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control)
+from django.utils.http import quote_etag
+
+from core import metrics
+from core.replicas import on_replica
+
+from .models import Group, Post, User
+
+GLOBAL = 'global'
+
+STATS = Counter()
+_stats_lock = threading.Lock()
+
+
+def count(event, value=1):
+    """Счётчики попаданий, промахов и инвалидаций для мониторинга."""
+    with _stats_lock:
+        STATS[event] += value
+    metrics.incr(f'page_cache_{event}', value)
+
+
+def index_scope():
+    return 'index'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def post_detail_scopes(post_id):
+    """Страница поста зависит и от профиля автора (число его постов)."""
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True
+    ).first()
+    return [post_scope(post_id), profile_scope(username)]
+
+
+def _version_key(scope):
+    return f'posts:version:{scope}'
+
+
+def _initial_version():
+    # После вытеснения счётчик начинается с «сейчас» в микросекундах,
+    # а не с единицы, чтобы не совпасть со старыми версиями страниц.
+    return time.time_ns() // 1000
+
+
+def _written_key(scope):
+    return f'posts:written:{scope}'
+
+
+def get_versions(scopes):
+    """Версии областей одним обращением к кэшу."""
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {
+        key: _initial_version() for key in keys if key not in versions
+    }
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+        count('invalidations')
+    if settings.DATABASE_REPLICAS:
+        cache.set_many(
+            {_written_key(scope): True for scope in scopes},
+            settings.REPLICA_PIN_SECONDS,
+        )
+
+
+def replica_settled(scopes):
+    """Можно ли доверять странице: не с реплики или реплика догнала запись."""
+    if not on_replica():
+        return True
+    return not cache.get_many([_written_key(scope) for scope in scopes])
+
+
+def invalidate(*scopes):
+    """Сбрасывает области сразу и ещё раз после фиксации транзакции.
+
+    Повторный сброс не даёт странице, собранной до коммита по старым
+    данным, остаться в кэше под новой версией.
+    """
+    bump(*scopes)
+    if not transaction.get_autocommit():
+        transaction.on_commit(lambda: bump(*scopes))
+
+
+def invalidate_post(post, *group_ids):
+    """Сбрасывает кэш всех страниц, на которых виден пост."""
+    slugs = Group.objects.filter(
+        pk__in=[pk for pk in group_ids if pk is not None]
+    ).values_list('slug', flat=True)
+    username = User.objects.filter(pk=post.author_id).values_list(
+        'username', flat=True
+    ).first()
+    invalidate(
+        index_scope(),
+        profile_scope(username),
+        post_scope(post.pk),
+        *(group_scope(slug) for slug in slugs),
+    )
+
+
+def page_key(request, scopes, versions, personal=True):
+    raw = '|'.join([
+        request.get_full_path(),
+        str(request.user.pk or 0) if personal else '0',
+        *scopes,
+        *map(str, versions),
+    ])
+    return 'posts:page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def versioned_cache_page(get_scopes, timeout=None):
+    """Кэширует GET-ответ view под ключом с версиями его областей.
+
+    get_scopes получает именованные аргументы view и возвращает список
+    областей, от которых зависит страница.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            scopes = [GLOBAL, *get_scopes(**kwargs)]
+            key = page_key(request, scopes, get_versions(scopes))
+            response = cache.get(key)
+            if response is not None:
+                count('hits')
+                return response
+            count('misses')
+            response = view_func(request, *args, **kwargs)
+            if (response.status_code == 200 and not response.cookies
+                    and replica_settled(scopes)):
+                cache.set(
+                    key, response,
+                    timeout if timeout is not None
+                    else settings.PAGE_CACHE_TIMEOUT,
+                )
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_page(get_scopes, public=False):
+    """Отвечает 304 Not Modified, пока версии областей не изменились.
+
+    ETag зависит от адреса, пользователя и версий областей и считается
+    до вызова view. no-cache заставляет клиента сверять ETag перед
+    каждым показом, private — не отдавать страницу другим людям.
+
+    public — страница одинакова для всех (ленты RSS): ETag не зависит от
+    пользователя, а прокси и агрегаторы могут держать копию
+    settings.FEED_MAX_AGE секунд.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            scopes = [GLOBAL, *get_scopes(**kwargs)]
+            key = page_key(
+                request, scopes, get_versions(scopes), personal=not public
+            )
+            etag = quote_etag(key.rsplit(':', 1)[1])
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                count('not_modified')
+            else:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200 and replica_settled(scopes):
+                    response['ETag'] = etag
+            # 304 отвечает на актуальный ETag и тоже может быть общим
+            if public and (response.status_code == 304
+                           or response.has_header('ETag')):
+                patch_cache_control(
+                    response, public=True, max_age=settings.FEED_MAX_AGE
+                )
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,66 @@
+"""Кэш отрисованных карточек постов для лент.
+
+Карточка зависит только от самого поста, его автора и группы, поэтому
+её HTML кэшируется по id поста вместе с отпечатком этих данных.
+Страница ленты читает все карточки одним get_many, дорисовывает
+недостающие или устаревшие (отпечаток не совпал) и сохраняет их одним
+set_many. Готовность миниатюры в отпечаток не входит: после её
+построения карточка удаляется из кэша (forget).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import cache as page_cache
+
+TEMPLATE = 'posts/includes/post_card.html'
+
+# Увеличить при изменении шаблона карточки
+VERSION = 1
+
+
+def _key(post_id):
+    return f'posts:card:{post_id}'
+
+
+def fingerprint(post):
+    group = post.group
+    raw = '|'.join(map(str, (
+        VERSION, post.text, post.pub_date.isoformat(), post.image or '',
+        post.author.username, post.author.get_full_name(),
+        group.slug if group else '', group.title if group else '',
+    )))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def render_cards(posts):
+    """HTML карточек постов в порядке posts."""
+    posts = list(posts)
+    cached = cache.get_many([_key(post.pk) for post in posts])
+    fresh = {}
+    html = []
+    for post in posts:
+        stamp = fingerprint(post)
+        entry = cached.get(_key(post.pk))
+        if entry is not None and entry[0] == stamp:
+            html.append(entry[1])
+            continue
+        card = render_to_string(TEMPLATE, {'post': post})
+        fresh[_key(post.pk)] = (stamp, card)
+        html.append(card)
+    if len(posts) > len(fresh):
+        page_cache.count('card_hits', len(posts) - len(fresh))
+    if fresh:
+        page_cache.count('card_misses', len(fresh))
+        cache.set_many(fresh, settings.PAGE_CACHE_TIMEOUT)
+    return html
+
+
+def forget(post_id):
+    cache.delete(_key(post_id))
+
+
+def forget_many(post_ids):
+    cache.delete_many([_key(post_id) for post_id in post_ids])
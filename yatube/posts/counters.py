@@ -0,0 +1,120 @@
+"""Денормализованные счётчики постов, комментариев и подписок."""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import AuthorStats, Comment, Follow, Group, Post
+
+
+def _bump(queryset, field, delta):
+    """Атомарно сдвигает счётчик, не уходя ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def bump_author(user_id, field, delta):
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if not _bump(stats, field, delta) and delta > 0:
+        # Строки ещё нет: создаём её и повторяем сдвиг
+        AuthorStats.objects.get_or_create(user_id=user_id)
+        _bump(stats, field, delta)
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        _bump(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def bump_post(post_id, delta):
+    _bump(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def add_counts(model, field, deltas):
+    """Прибавляет к счётчикам многих строк: deltas — {pk: сдвиг > 0}.
+
+    Для массовой загрузки: строки с одинаковым сдвигом обновляются одним
+    запросом, недостающие строки AuthorStats создаются заранее.
+    """
+    if model is AuthorStats:
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(user_id=pk) for pk in deltas], ignore_conflicts=True
+        )
+    by_delta = {}
+    for pk, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(pk)
+    for delta, pks in by_delta.items():
+        # Пачками, чтобы не упереться в лимит параметров SQLite
+        for start in range(0, len(pks), 500):
+            model.objects.filter(pk__in=pks[start:start + 500]).update(
+                **{field: F(field) + delta}
+            )
+
+
+def get_stats(user_id):
+    """Счётчики пользователя одной строкой (нули, если записей нет)."""
+    return (
+        AuthorStats.objects.filter(user_id=user_id).first()
+        or AuthorStats(user_id=user_id)
+    )
+
+
+def _actual_author_stats():
+    stats = {}
+    queries = (
+        ('posts_count', Post.objects.values_list('author')),
+        ('followers_count', Follow.objects.values_list('author')),
+        ('following_count', Follow.objects.values_list('user')),
+    )
+    for field, rows in queries:
+        for user_id, count in rows.order_by().annotate(n=Count('*')):
+            stats.setdefault(user_id, {})[field] = count
+    return stats
+
+
+def _reconcile_model(queryset, field, actual):
+    """Исправляет расхождения; возвращает число исправленных строк."""
+    fixed = []
+    for obj in queryset.only('pk', field).iterator():
+        value = actual.get(obj.pk, 0)
+        if getattr(obj, field) != value:
+            setattr(obj, field, value)
+            fixed.append(obj)
+    queryset.model.objects.bulk_update(fixed, [field], batch_size=500)
+    return len(fixed)
+
+
+@transaction.atomic
+def reconcile():
+    """Пересчитывает все счётчики по исходным таблицам."""
+    fixed = _reconcile_model(
+        Group.objects.all(), 'posts_count',
+        dict(Post.objects.exclude(group=None).values_list('group')
+             .order_by().annotate(n=Count('*'))),
+    )
+    fixed += _reconcile_model(
+        Post.objects.all(), 'comments_count',
+        dict(Comment.objects.values_list('post')
+             .order_by().annotate(n=Count('*'))),
+    )
+    actual = _actual_author_stats()
+    existing = set(AuthorStats.objects.values_list('user_id', flat=True))
+    missing = [
+        AuthorStats(user_id=user_id, **counts)
+        for user_id, counts in actual.items()
+        if user_id not in existing
+    ]
+    AuthorStats.objects.bulk_create(missing)
+    fixed += len(missing)
+    fields = ('posts_count', 'followers_count', 'following_count')
+    drifted = []
+    for stats in AuthorStats.objects.iterator():
+        counts = actual.get(stats.user_id, {})
+        changed = False
+        for field in fields:
+            if getattr(stats, field) != counts.get(field, 0):
+                setattr(stats, field, counts.get(field, 0))
+                changed = True
+        if changed:
+            drifted.append(stats)
+    AuthorStats.objects.bulk_update(drifted, fields, batch_size=500)
+    return fixed + len(drifted)
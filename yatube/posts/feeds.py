@@ -0,0 +1,160 @@
+"""Ленты RSS, Atom и JSON Feed для групп и авторов.
+
+Посты (не больше FEED_SIZE) читаются до ответа, чтобы запросы шли
+внутри view и учитывались query_budget; текст документа генератор
+отдаёт по записям. Попутно ответ копится и после последней записи
+кладётся в кэш под ключом с версиями областей, поэтому следующий запрос
+отдаётся из кэша, а изменение поста в группе или у автора делает копию
+недоступной.
+"""
+import hashlib
+import json
+import re
+from xml.sax.saxutils import escape as xml_escape
+from xml.sax.saxutils import quoteattr
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+from django.utils.text import Truncator
+
+from . import cache
+
+# Символы, запрещённые в XML 1.0: управляющие, кроме \t, \n и \r,
+# суррогаты и U+FFFE, U+FFFF
+XML_ILLEGAL = re.compile(
+    '[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]'
+)
+
+
+def escape(text):
+    """Экранирует текст для XML, выбрасывая недопустимые в нём символы."""
+    return xml_escape(XML_ILLEGAL.sub('', text))
+
+
+def _title(post):
+    return Truncator(post.text).words(10)
+
+
+def _rss(request, title, link, posts):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<rss version="2.0"><channel>'
+        f'<title>{escape(title)}</title>'
+        f'<link>{escape(link)}</link>'
+        f'<description>{escape(title)}</description>'
+    )
+    for post in posts:
+        url = request.build_absolute_uri(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        yield (
+            '<item>'
+            f'<title>{escape(_title(post))}</title>'
+            f'<link>{escape(url)}</link>'
+            f'<guid>{escape(url)}</guid>'
+            f'<pubDate>{rfc2822_date(post.pub_date)}</pubDate>'
+            f'<author>{escape(post.author.username)}</author>'
+            f'<description>{escape(post.text)}</description>'
+            '</item>'
+        )
+    yield '</channel></rss>\n'
+
+
+def _atom(request, title, link, posts):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f'<title>{escape(title)}</title>'
+        f'<link href={quoteattr(link)} rel="alternate"/>'
+        f'<id>{escape(link)}</id>'
+    )
+    first = True
+    for post in posts:
+        if first:
+            # Лента отсортирована по убыванию даты: первый пост — новейший
+            yield f'<updated>{rfc3339_date(post.pub_date)}</updated>'
+            first = False
+        url = request.build_absolute_uri(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        yield (
+            '<entry>'
+            f'<title>{escape(_title(post))}</title>'
+            f'<link href={quoteattr(url)} rel="alternate"/>'
+            f'<id>{escape(url)}</id>'
+            f'<updated>{rfc3339_date(post.pub_date)}</updated>'
+            f'<author><name>{escape(post.author.username)}</name></author>'
+            f'<content type="text">{escape(post.text)}</content>'
+            '</entry>'
+        )
+    if first:
+        yield f'<updated>{rfc3339_date(timezone.now())}</updated>'
+    yield '</feed>\n'
+
+
+def _json(request, title, link, posts):
+    yield '{"version":"https://jsonfeed.org/version/1.1",'
+    yield f'"title":{json.dumps(title)},"home_page_url":{json.dumps(link)},'
+    yield '"items":['
+    separator = ''
+    for post in posts:
+        url = request.build_absolute_uri(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        yield separator + json.dumps({
+            'id': url,
+            'url': url,
+            'title': _title(post),
+            'content_text': post.text,
+            'date_published': rfc3339_date(post.pub_date),
+            'authors': [{'name': post.author.username}],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']}\n'
+
+
+FORMATS = {
+    'rss': ('application/rss+xml; charset=utf-8', _rss),
+    'atom': ('application/atom+xml; charset=utf-8', _atom),
+    'json': ('application/feed+json; charset=utf-8', _json),
+}
+
+
+def feed_key(request, scopes):
+    # Лента одинакова для всех пользователей, поэтому без request.user
+    raw = '|'.join([
+        request.build_absolute_uri(),
+        *scopes,
+        *map(str, cache.get_versions(scopes)),
+    ])
+    return 'posts:feed:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _stream_and_store(key, chunks):
+    parts = []
+    for chunk in chunks:
+        data = chunk.encode()
+        parts.append(data)
+        yield data
+    # Сюда доходим, только если клиент дочитал ленту до конца
+    django_cache.set(key, b''.join(parts), settings.PAGE_CACHE_TIMEOUT)
+
+
+def feed_response(request, fmt, title, link, posts, scopes):
+    """Ответ с лентой из кэша или потоковый с записью в кэш."""
+    content_type, render = FORMATS[fmt]
+    key = feed_key(request, [cache.GLOBAL, *scopes])
+    body = django_cache.get(key)
+    if body is not None:
+        cache.count('hits')
+        return HttpResponse(body, content_type=content_type)
+    cache.count('misses')
+    posts = list(posts.select_related('author')[:settings.FEED_SIZE])
+    chunks = render(request, title, request.build_absolute_uri(link), posts)
+    return StreamingHttpResponse(
+        _stream_and_store(key, chunks), content_type=content_type
+    )
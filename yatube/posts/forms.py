@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images
 from .models import Post, Comment
 
 
@@ -10,6 +12,16 @@ class PostForm(forms.ModelForm):
         help_text = 'Текст сообщения и группа'
         fields = ('group', 'text', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            # Имя уже сохранённого файла: FileField не пишет его повторно
+            return images.ingest(image)
+        except images.ImageRejected as error:
+            raise forms.ValidationError(str(error))
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,91 @@
+"""Приём картинок постов: нормализация и дедупликация по содержимому.
+
+Загрузка читается кусками, декодируется один раз (для JPEG — сразу в
+уменьшенном масштабе), поворачивается по EXIF, ужимается до
+POST_IMAGE_MAX_SIDE и перекодируется в WebP без метаданных. Имя файла —
+хэш результата, поэтому одинаковые картинки хранятся одним файлом.
+Хэш исходных байтов запоминается в кэше: повторная загрузка того же
+файла не декодируется вовсе.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+UPLOAD_TO = 'posts/'
+
+
+class ImageRejected(ValueError):
+    """Файл не является допустимой картинкой."""
+
+
+def _output_format(image):
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    if image.mode == 'RGBA':
+        return 'PNG', 'png'
+    return 'JPEG', 'jpg'
+
+
+def _hash(upload):
+    """Считает хэш загрузки, читая её кусками (без копии в памяти)."""
+    if upload.size and upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ImageRejected('Файл слишком большой.')
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def normalize(source):
+    """Возвращает (байты, расширение) нормализованной картинки."""
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    try:
+        image = Image.open(source)
+        if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ImageRejected('Слишком большое разрешение.')
+        if getattr(image, 'is_animated', False):
+            # Анимацию не пережимаем, но дедупликация работает и для неё
+            source.seek(0)
+            return source.read(), image.format.lower()
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ImageRejected('Не удалось прочитать картинку.') from error
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert(
+            'RGBA' if 'transparency' in image.info else 'RGB'
+        )
+    output_format, extension = _output_format(image)
+    if output_format == 'JPEG':
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    # exif и прочие метаданные не передаются, поэтому не сохраняются
+    image.save(
+        output, output_format,
+        quality=settings.POST_IMAGE_QUALITY, optimize=True,
+    )
+    return output.getvalue(), extension
+
+
+def ingest(upload):
+    """Сохраняет загрузку и возвращает имя файла в хранилище."""
+    raw_digest = _hash(upload)
+    raw_key = f'posts:image:raw:{raw_digest}'
+    name = cache.get(raw_key)
+    if name and default_storage.exists(name):
+        return name
+    data, extension = normalize(upload)
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'{UPLOAD_TO}{digest[:2]}/{digest}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    cache.set(raw_key, name, None)
+    return name
@@ -0,0 +1,288 @@
+"""Массовая загрузка постов, комментариев и подписок.
+
+Записи читаются потоком и копятся в буферах; буферы сбрасываются
+через bulk_create пачками по batch_size, каждая пачка — в своей
+транзакции. Авторы и группы ищутся по словарям в памяти, новые
+создаются пачкой при сбросе. bulk_create не посылает сигналы, поэтому
+каждая пачка в той же транзакции раскладывает свои посты и подписки по
+лентам и сдвигает счётчики групп, постов и авторов на то, что вставила;
+полных проходов по таблицам, держащих блокировку записи, нет, и сайт
+может работать во время загрузки. Популярное и кэш пересобираются один
+раз в конце (finish). Поисковый индекс ведут триггеры FTS.
+
+Формат записи (JSONL — объект на строку, CSV — строка с заголовком)::
+
+    post:    id, author, text, group, pub_date
+    comment: post, author, text, created
+    follow:  user, author
+
+id поста — внешний ключ из источника, на него ссылаются комментарии.
+Тип записи берётся из поля type, а если его нет — из default_type.
+"""
+import csv
+import json
+import time
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache, counters, timeline, trending
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+
+
+class RecordRejected(ValueError):
+    """Запись нельзя загрузить."""
+
+
+def read_jsonl(stream):
+    """Записи файла JSONL; на месте испорченной строки — None."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+class Importer:
+    """Загрузчик записей; run() принимает любой итератор словарей."""
+
+    def __init__(self, batch_size=BATCH_SIZE, create_missing=False,
+                 default_type='post', progress=None):
+        self.batch_size = batch_size
+        self.create_missing = create_missing
+        self.default_type = default_type
+        self.progress = progress
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.post_ids = {}
+        self.posts = []
+        self.comments = []
+        self.follows = []
+        self.imported = {'post': 0, 'comment': 0, 'follow': 0}
+        # На сколько пачка сдвигает счётчики: (модель, поле) -> {pk: сдвиг}
+        self.deltas = {}
+        self.skipped = 0
+        self.started = time.perf_counter()
+
+    @property
+    def total(self):
+        return sum(self.imported.values())
+
+    def _required(self, record, key):
+        value = record[key]
+        if value is None or value == '':
+            raise RecordRejected(f'Пустое поле: {key}')
+        return str(value)
+
+    def _date(self, value):
+        if not value:
+            return timezone.now()
+        try:
+            # Несуществующая дата вроде 2015-13-01 — ValueError
+            date = parse_datetime(str(value))
+        except ValueError:
+            date = None
+        if date is None:
+            raise RecordRejected(f'Неверная дата: {value}')
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        return date
+
+    def add(self, record):
+        """Кладёт запись в буфер; негодная запись считается пропущенной."""
+        try:
+            if not isinstance(record, dict):
+                raise RecordRejected('Запись не читается')
+            kind = record.get('type') or self.default_type
+            if kind == 'post':
+                post = Post(
+                    text=self._required(record, 'text'),
+                    pub_date=self._date(record.get('pub_date')),
+                )
+                post.keep_date = True
+                self.posts.append((
+                    record.get('id'), post, self._required(record, 'author'),
+                    record.get('group') or None,
+                ))
+            elif kind == 'comment':
+                comment = Comment(
+                    text=self._required(record, 'text'),
+                    created=self._date(record.get('created')),
+                )
+                comment.keep_date = True
+                self.comments.append((
+                    self._required(record, 'post'), comment,
+                    self._required(record, 'author'),
+                ))
+            elif kind == 'follow':
+                self.follows.append((
+                    self._required(record, 'user'),
+                    self._required(record, 'author'),
+                ))
+            else:
+                raise RecordRejected(f'Неизвестный тип записи: {kind}')
+        except (KeyError, RecordRejected):
+            self.skipped += 1
+            return
+        pending = len(self.posts) + len(self.comments) + len(self.follows)
+        if pending >= self.batch_size:
+            self.flush()
+
+    def _resolve_users(self, names):
+        missing = {name for name in names if name not in self.users}
+        if missing and self.create_missing:
+            User.objects.bulk_create(
+                [User(username=name, password='!') for name in missing],
+                ignore_conflicts=True,
+            )
+            self.users.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk'))
+
+    def _resolve_groups(self, slugs):
+        missing = {slug for slug in slugs if slug and slug not in self.groups}
+        if missing and self.create_missing:
+            Group.objects.bulk_create(
+                [
+                    Group(title=slug, slug=slug, description='')
+                    for slug in missing
+                ],
+                ignore_conflicts=True,
+            )
+            self.groups.update(Group.objects.filter(
+                slug__in=missing
+            ).values_list('slug', 'pk'))
+
+    def _flush_posts(self):
+        self._resolve_users(author for _, _, author, _ in self.posts)
+        self._resolve_groups(group for _, _, _, group in self.posts)
+        batch = []
+        external_ids = []
+        for external_id, post, author, group in self.posts:
+            post.author_id = self.users.get(author)
+            post.group_id = self.groups.get(group)
+            if post.author_id is None or group and post.group_id is None:
+                self.skipped += 1
+                continue
+            batch.append(post)
+            external_ids.append(external_id)
+        Post.objects.bulk_create(batch)
+        inserted = self._inserted_ids(batch)
+        for external_id, post, post_id in zip(external_ids, batch, inserted):
+            post.pk = post_id
+            if external_id is not None:
+                self.post_ids[str(external_id)] = post_id
+        timeline.fan_out_posts(batch)
+        self._count(Group, 'posts_count', (post.group_id for post in batch))
+        self._count(
+            AuthorStats, 'posts_count', (post.author_id for post in batch)
+        )
+        self.imported['post'] += len(batch)
+        self.posts = []
+
+    def _inserted_ids(self, batch):
+        """id, выданные базой постам пачки, в порядке вставки.
+
+        SQLite не возвращает id из bulk_create. Пачка вставляется в
+        транзакции flush, и с первой вставки она держит блокировку
+        записи: чужих строк между нашими нет, и id пачки — последние
+        len(batch) id таблицы подряд.
+        """
+        if not batch or batch[0].pk is not None:
+            return [post.pk for post in batch]
+        last = Post.objects.aggregate(last=Max('id'))['last']
+        return range(last - len(batch) + 1, last + 1)
+
+    def _flush_comments(self):
+        self._resolve_users(author for _, _, author in self.comments)
+        batch = []
+        for post_ref, comment, author in self.comments:
+            comment.post_id = self.post_ids.get(post_ref)
+            comment.author_id = self.users.get(author)
+            if comment.post_id is None or comment.author_id is None:
+                self.skipped += 1
+                continue
+            batch.append(comment)
+        Comment.objects.bulk_create(batch)
+        self._count(
+            Post, 'comments_count', (comment.post_id for comment in batch)
+        )
+        self.imported['comment'] += len(batch)
+        self.comments = []
+
+    def _flush_follows(self):
+        self._resolve_users(
+            name for pair in self.follows for name in pair
+        )
+        pairs = set()
+        for user, author in self.follows:
+            user_id, author_id = self.users.get(user), self.users.get(author)
+            if user_id is None or author_id is None or user_id == author_id:
+                self.skipped += 1
+                continue
+            pairs.add((user_id, author_id))
+        # Уже существующие подписки не вставляются и не считаются
+        pairs -= set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs}
+        ).values_list('user_id', 'author_id'))
+        Follow.objects.bulk_create(
+            [Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs],
+            ignore_conflicts=True,
+        )
+        timeline.backfill_follows(pairs)
+        self._count(
+            AuthorStats, 'following_count', (user for user, _ in pairs)
+        )
+        self._count(
+            AuthorStats, 'followers_count', (author for _, author in pairs)
+        )
+        self.imported['follow'] += len(pairs)
+        self.follows = []
+
+    def _count(self, model, field, pks):
+        self.deltas.setdefault((model, field), Counter()).update(
+            pk for pk in pks if pk is not None
+        )
+
+    def _apply_counts(self):
+        for (model, field), deltas in self.deltas.items():
+            counters.add_counts(model, field, deltas)
+        self.deltas = {}
+
+    def flush(self):
+        # Посты раньше комментариев: те ссылаются на id из этой же пачки
+        with transaction.atomic():
+            if self.posts:
+                self._flush_posts()
+            if self.comments:
+                self._flush_comments()
+            if self.follows:
+                self._flush_follows()
+            self._apply_counts()
+        if self.progress:
+            elapsed = time.perf_counter() - self.started
+            self.progress(self.total, self.total / elapsed if elapsed else 0)
+
+    def run(self, records):
+        """Загружает записи и пересобирает производные данные."""
+        for record in records:
+            self.add(record)
+        self.flush()
+        self.finish()
+        return self.imported
+
+    def finish(self):
+        trending.rebuild()
+        cache.invalidate(cache.GLOBAL)
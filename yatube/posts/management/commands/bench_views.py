@@ -0,0 +1,240 @@
+"""Замер времени ответа лент на первой и глубокой странице.
+
+Запускать на базе, заполненной seed_data, например::
+
+    export YATUBE_DATABASE=/tmp/bench.sqlite3
+    python manage.py migrate
+    python manage.py seed_data --seed 1
+    python manage.py bench_views --output bench.json
+    python manage.py bench_views --compare bench.json
+
+По умолчанию кэш страниц отключён (DummyCache), чтобы мерить работу
+view, а не попадания в кэш; --warm оставляет настроенный кэш.
+
+--sqlite default|production сравнивает режимы SQLite на настоящих
+страницах: default — журнал отката и новое соединение на каждый запрос,
+production — прагмы SQLITE_PRAGMAS и CONN_MAX_AGE. После каждого
+запроса соединения закрываются так же, как в обработчике WSGI.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.query_budget import capture_queries
+from posts.models import AuthorStats, Comment, Group, Post, Timeline, User
+from posts.paginator import NEXT, encode_cursor
+from yatube.settings import COMMENTS_PER_PAGE, COUNT_POST_FOR_PAGE
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+SQLITE_MODES = {
+    'default': {'SQLITE_PRODUCTION': False, 'CONN_MAX_AGE': 0},
+    'production': {'SQLITE_PRODUCTION': True, 'CONN_MAX_AGE': 600},
+}
+
+
+def _cursor(queryset, field, pk_field, offset):
+    """Курсор на страницу, начинающуюся с записи номер offset."""
+    if offset <= 0:
+        return None
+    row = queryset.order_by(f'-{field}', f'-{pk_field}').values_list(
+        field, pk_field
+    )[offset - 1:offset].first()
+    if row is None:
+        return None
+    return encode_cursor(NEXT, *row)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _percentile(samples, percent):
+    if len(samples) < 2:
+        return samples[0]
+    return statistics.quantiles(samples, n=100)[percent - 1]
+
+
+class Command(BaseCommand):
+    help = 'Замеряет index, group_posts, profile, post_detail и follow_index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument(
+            '--deep-page', type=int, default=1000,
+            help='номер «глубокой» страницы',
+        )
+        parser.add_argument('--warm', action='store_true')
+        parser.add_argument('--output', help='куда записать JSON')
+        parser.add_argument(
+            '--compare', help='JSON прошлого запуска для сравнения p50',
+        )
+        parser.add_argument(
+            '--sqlite', choices=tuple(SQLITE_MODES),
+            help='режим SQLite; по умолчанию — из настроек',
+        )
+
+    def cases(self, deep_page):
+        """(имя, страница, адрес, пользователь) для каждого замера."""
+        group = Group.objects.order_by('-posts_count').first()
+        author = AuthorStats.objects.order_by('-posts_count').first()
+        reader = AuthorStats.objects.order_by('-following_count').first()
+        post = Post.objects.order_by('-comments_count').first()
+        if not (group and author and reader and post):
+            raise CommandError('База пуста: сначала запустите seed_data.')
+        author = User.objects.get(pk=author.user_id)
+        reader = User.objects.get(pk=reader.user_id)
+        offset = (deep_page - 1) * COUNT_POST_FOR_PAGE
+        feeds = (
+            ('index', reverse('posts:index'),
+             Post.objects.all(), 'pub_date', 'id', None),
+            ('group_posts', reverse('posts:group_list', args=[group.slug]),
+             group.posts.all(), 'pub_date', 'id', None),
+            ('profile', reverse('posts:profile', args=[author.username]),
+             author.posts.all(), 'pub_date', 'id', None),
+            ('follow_index', reverse('posts:follow_index'),
+             Timeline.objects.filter(user=reader), 'pub_date', 'post_id',
+             reader),
+        )
+        for name, url, queryset, field, pk_field, user in feeds:
+            yield name, 1, url, user
+            cursor = _cursor(queryset, field, pk_field, offset)
+            if cursor:
+                yield name, deep_page, f'{url}?cursor={cursor}', user
+            else:
+                self.stdout.write(f'{name}: нет страницы {deep_page}')
+        url = reverse('posts:post_detail', args=[post.pk])
+        yield 'post_detail', 1, url, None
+        cursor = _cursor(
+            Comment.objects.filter(post=post), 'created', 'id',
+            (deep_page - 1) * COMMENTS_PER_PAGE,
+        )
+        if cursor:
+            yield 'post_detail', deep_page, f'{url}?cursor={cursor}', None
+        else:
+            self.stdout.write(f'post_detail: нет страницы {deep_page}')
+
+    def measure(self, client, url, repeat):
+        for _ in range(2):
+            client.get(url)
+            close_old_connections()
+        samples = []
+        queries = 0
+        for _ in range(repeat):
+            with capture_queries() as statements:
+                started = time.perf_counter()
+                response = client.get(url)
+                close_old_connections()
+                samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            queries = len(statements)
+        tracemalloc.start()
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'p50_ms': round(_percentile(samples, 50), 3),
+            'p90_ms': round(_percentile(samples, 90), 3),
+            'p99_ms': round(_percentile(samples, 99), 3),
+            'mean_ms': round(statistics.mean(samples), 3),
+            'queries': queries,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def run(self, options):
+        results = []
+        for name, page, url, user in self.cases(options['deep_page']):
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            row = {'view': name, 'page': page, 'url': url}
+            row.update(self.measure(client, url, options['repeat']))
+            results.append(row)
+            self.stdout.write(
+                f"{name:<13} стр. {page:<6} p50 {row['p50_ms']:>8.2f} мс  "
+                f"p99 {row['p99_ms']:>8.2f} мс  запросов {row['queries']:>2}  "
+                f"память {row['peak_kb']:>8.1f} КБ"
+            )
+        return results
+
+    def compare(self, results, path):
+        with open(path, encoding='utf-8') as source:
+            previous = {
+                (row['view'], row['page']): row
+                for row in json.load(source)['results']
+            }
+        self.stdout.write(f'Сравнение с {path}:')
+        for row in results:
+            old = previous.get((row['view'], row['page']))
+            if old is None:
+                continue
+            change = (row['p50_ms'] - old['p50_ms']) / old['p50_ms']
+            self.stdout.write(
+                f"{row['view']:<13} стр. {row['page']:<6} "
+                f"p50 {old['p50_ms']:.2f} -> {row['p50_ms']:.2f} мс "
+                f"({change:+.0%})"
+            )
+
+    def use_sqlite(self, mode):
+        """Переключает соединение на режим SQLite; вернёт его настройки."""
+        if connection.vendor != 'sqlite':
+            raise CommandError('--sqlite работает только с SQLite.')
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = (
+            SQLITE_MODES[mode]['CONN_MAX_AGE']
+        )
+        if mode == 'default':
+            # WAL сохраняется в файле базы: возвращаем журнал отката
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode = delete')
+            connection.close()
+        return {'SQLITE_PRODUCTION': SQLITE_MODES[mode]['SQLITE_PRODUCTION']}
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if not options['warm']:
+            overrides['CACHES'] = NO_CACHE
+        if options['sqlite']:
+            overrides.update(self.use_sqlite(options['sqlite']))
+        with override_settings(**overrides):
+            results = self.run(options)
+        report = {
+            'commit': _git_commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'timeline': Timeline.objects.count(),
+            },
+            'options': {
+                key: options[key]
+                for key in ('repeat', 'deep_page', 'warm', 'sqlite')
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(results, options['compare'])
@@ -0,0 +1,17 @@
+"""Пересчёт рекомендаций «кого почитать»; запускать по расписанию."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации авторов по графу подписок.'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = suggestions.build()
+        self.stdout.write(
+            f'Рекомендаций: {total} за {time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,22 @@
+"""Затухание оценок популярного; запускать раз в TRENDING_DECAY_INTERVAL."""
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Применяет затухание к оценкам ленты популярного.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='пересчитать оценки с нуля по постам и комментариям',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            trending.rebuild()
+            self.stdout.write(self.style.SUCCESS('Оценки пересчитаны.'))
+            return
+        factor = trending.decay()
+        self.stdout.write(f'Оценки умножены на {factor:.4f}')
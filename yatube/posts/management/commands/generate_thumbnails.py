@@ -0,0 +1,61 @@
+"""Построение миниатюр для уже загруженных картинок."""
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import cache, cards, thumbnails
+from posts.models import Post
+
+
+def _generate(name):
+    try:
+        thumbnails.generate(name)
+    except Exception as error:
+        return name, str(error)
+    return name, None
+
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры всех размеров для картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='число процессов (по умолчанию — по числу ядер)',
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='').exclude(image=None)
+            .values_list('image', flat=True).distinct()
+        )
+        # Дочерние процессы откроют свои соединения с базой
+        connections.close_all()
+        done = failed = 0
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['processes']) as pool:
+            for name, error in pool.imap_unordered(
+                    _generate, names, chunksize=16):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    done += 1
+        # Карточки и страницы с заглушками теперь можно собрать заново
+        post_ids = Post.objects.exclude(image='').exclude(image=None)
+        batch = []
+        for post_id in post_ids.values_list('pk', flat=True).iterator():
+            batch.append(post_id)
+            if len(batch) >= BATCH_SIZE:
+                cards.forget_many(batch)
+                batch = []
+        cards.forget_many(batch)
+        cache.invalidate(cache.GLOBAL)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, с ошибками: {failed}'
+        ))
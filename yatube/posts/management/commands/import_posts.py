@@ -0,0 +1,56 @@
+"""Массовая загрузка постов, комментариев и подписок из JSONL или CSV."""
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.importer import BATCH_SIZE, Importer, read_csv, read_jsonl
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки пачками через '
+        'bulk_create и в конце пересобирает счётчики, поиск и ленты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='файл .jsonl или .csv; «-» — стандартный ввод'
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='по умолчанию определяется по расширению файла',
+        )
+        parser.add_argument(
+            '--type', choices=('post', 'comment', 'follow'), default='post',
+            help='тип записей без поля type (для CSV — тип всего файла)',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='создавать неизвестных авторов и группы',
+        )
+
+    def progress(self, total, rate):
+        self.stdout.write(f'Загружено {total} записей, {rate:.0f} зап/с')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        reader = read_csv if file_format == 'csv' else read_jsonl
+        importer = Importer(
+            batch_size=options['batch_size'],
+            create_missing=options['create_missing'],
+            default_type=options['type'],
+            progress=self.progress,
+        )
+        if path == '-':
+            imported = importer.run(reader(sys.stdin))
+        else:
+            with open(path, encoding='utf-8', newline='') as stream:
+                imported = importer.run(reader(stream))
+        self.stdout.write(self.style.SUCCESS(
+            'Постов: {post}, комментариев: {comment}, подписок: {follow}; '
+            'пропущено: {skipped}'.format(skipped=importer.skipped, **imported)
+        ))
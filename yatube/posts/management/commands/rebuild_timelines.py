@@ -0,0 +1,21 @@
+"""Пересборка материализованных лент подписок."""
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок из Follow и Post.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя (можно указать несколько раз); '
+                 'по умолчанию пересобираются все ленты.',
+        )
+
+    def handle(self, *args, **options):
+        created = timeline.rebuild(options['user_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Записано записей ленты: {created}')
+        )
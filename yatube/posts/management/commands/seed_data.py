@@ -0,0 +1,48 @@
+"""Заполнение базы большим воспроизводимым набором данных."""
+from django.core.management.base import BaseCommand
+
+from posts import seed
+from posts.importer import BATCH_SIZE, Importer
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу сгенерированными пользователями, постами, '
+        'комментариями и подписками (для bench_views).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=5_000_000)
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='среднее число подписок на пользователя',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def progress(self, total, rate):
+        self.stdout.write(f'Загружено {total} записей, {rate:.0f} зап/с')
+
+    def handle(self, *args, **options):
+        if Post.objects.exists():
+            self.stderr.write(
+                'База не пуста: набор не будет совпадать с другими '
+                'запусками с тем же --seed.'
+            )
+        seed.create_users(options['users'])
+        importer = Importer(
+            batch_size=options['batch_size'], create_missing=True,
+            progress=self.progress,
+        )
+        imported = importer.run(seed.records(
+            options['users'], options['posts'], options['comments'],
+            options['groups'], options['follows'], options['seed'],
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            'Постов: {post}, комментариев: {comment}, '
+            'подписок: {follow}'.format(**imported)
+        ))
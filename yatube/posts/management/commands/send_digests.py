@@ -0,0 +1,12 @@
+"""Рассылает дайджесты уведомлений сейчас, не дожидаясь задачи."""
+from django.core.management.base import BaseCommand
+
+from posts import notifications
+
+
+class Command(BaseCommand):
+    help = 'Отправляет накопленные уведомления о новых постах.'
+
+    def handle(self, *args, **options):
+        sent = notifications.send_digests()
+        self.stdout.write(f'Отправлено писем: {sent}')
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F
+
+BATCH_SIZE = 1000
+
+
+def fill_timeline(apps, schema_editor):
+    """Раскладывает существующие посты в ленты подписчиков авторов."""
+    Follow = apps.get_model('posts', 'Follow')
+    Timeline = apps.get_model('posts', 'Timeline')
+    rows = Follow.objects.exclude(user=F('author')).filter(
+        author__posts__isnull=False
+    ).values_list(
+        'user_id', 'author__posts__pk', 'author__posts__pub_date'
+    ).iterator()
+    batch = []
+    for user_id, post_id, pub_date in rows:
+        batch.append(
+            Timeline(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        )
+        if len(batch) >= BATCH_SIZE:
+            Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0004_auto_20220812_1434'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Timeline',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timeline',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_feed_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timeline',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(fill_timeline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    for group_id, count in Post.objects.exclude(group=None).values_list(
+            'group').order_by().annotate(n=Count('*')):
+        Group.objects.filter(pk=group_id).update(posts_count=count)
+    for post_id, count in Comment.objects.values_list(
+            'post').order_by().annotate(n=Count('*')):
+        Post.objects.filter(pk=post_id).update(comments_count=count)
+    stats = {}
+    queries = (
+        ('posts_count', Post.objects.values_list('author')),
+        ('followers_count', Follow.objects.values_list('author')),
+        ('following_count', Follow.objects.values_list('user')),
+    )
+    for field, rows in queries:
+        for user_id, count in rows.order_by().annotate(n=Count('*')):
+            stats.setdefault(user_id, {})[field] = count
+    AuthorStats.objects.bulk_create(
+        AuthorStats(user_id=user_id, **counts)
+        for user_id, counts in stats.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0005_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Число постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Число подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
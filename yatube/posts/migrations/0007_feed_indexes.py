@@ -0,0 +1,72 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:28
+
+from django.db import migrations, models
+import django.db.models.expressions
+from django.db.models import Count, Min
+
+
+def drop_duplicate_follows(apps, schema_editor):
+    """Оставляет одну подписку на пару и убирает подписки на себя.
+
+    Счётчики подписок из 0006 учли удалённые строки, а исторические
+    модели сигналов не шлют, поэтому счётчики пересчитываются здесь же.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    keep = Follow.objects.values('user', 'author').annotate(
+        keep_id=Min('id')
+    ).values('keep_id')
+    deleted, _ = Follow.objects.exclude(id__in=keep).delete()
+    self_follows, _ = Follow.objects.filter(
+        user=django.db.models.expressions.F('author')
+    ).delete()
+    if not deleted and not self_follows:
+        return
+    AuthorStats.objects.update(followers_count=0, following_count=0)
+    for field, column in (
+        ('followers_count', 'author'), ('following_count', 'user'),
+    ):
+        for user_id, count in Follow.objects.values_list(
+                column).order_by().annotate(n=Count('*')):
+            AuthorStats.objects.filter(pk=user_id).update(**{field: count})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ('-pub_date', '-id'), 'verbose_name': ('Сообщение',), 'verbose_name_plural': ('Сообщения',)},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created', '-id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_feed_idx'),
+        ),
+        migrations.RunPython(
+            drop_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='no_self_follow'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from posts import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(
+            f'DROP TRIGGER IF EXISTS {search.TABLE}_{suffix}'
+        )
+    schema_editor.execute(f'DROP TABLE IF EXISTS {search.TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.19 on 2026-10-18 18:30
+
+from django.db import migrations
+import posts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_notifications'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='created',
+            field=posts.models.CreatedField(auto_now_add=True, verbose_name='Дата комментарии'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='pub_date',
+            field=posts.models.CreatedField(auto_now_add=True, verbose_name='Дата публикации'),
+        ),
+    ]
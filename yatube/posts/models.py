@@ -5,11 +5,52 @@ from django.db import models
 User = get_user_model()
 
 
-class Group(models.Model):
+class CreatedField(models.DateTimeField):
+    """auto_now_add, который оставляет дату объекта с keep_date=True.
+
+    Загрузчик (importer.py) так сохраняет даты из источника, не меняя
+    поле для остальных записей.
+    """
+
+    def pre_save(self, model_instance, add):
+        if add and getattr(model_instance, 'keep_date', False):
+            return getattr(model_instance, self.attname)
+        return super().pre_save(model_instance, add)
+
+
+class CountersMixin:
+    """Не даёт полному save() затереть счётчики counter_fields.
+
+    Счётчики сдвигаются через F() (counters.py); без этого save() формы
+    или админки записал бы прочитанное раньше значение и потерял
+    параллельные сдвиги.
+    """
+    counter_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if (update_fields is None and not force_insert
+                and not self._state.adding):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
+
+class Group(CountersMixin, models.Model):
     """Модель для работы с группами в базе данных."""
     title = models.CharField('Название группы', max_length=200)
     slug = models.SlugField('Код группы в url', unique=True)
     description = models.TextField('Описание', max_length=500)
+    posts_count = models.PositiveIntegerField(
+        'Число постов', default=0, editable=False
+    )
+
+    counter_fields = ('posts_count',)
 
     class Meta:
         verbose_name = 'Группа'
@@ -20,13 +61,13 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class Post(CountersMixin, models.Model):
     """Модель для работы с постами в базе данных."""
     text = models.TextField(
         'Текст',
         help_text='Введите текст поста'
     )
-    pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    pub_date = CreatedField('Дата публикации', auto_now_add=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -50,11 +91,30 @@ class Post(models.Model):
         null=True,
         help_text='Загрузите картинку'
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False
+    )
+
+    counter_fields = ('comments_count',)
 
     class Meta:
         verbose_name = 'Сообщение',
         verbose_name_plural = 'Сообщения',
-        ordering = ('-pub_date'),
+        ordering = ('-pub_date', '-id')
+        # Индексы повторяют фильтры и сортировку лент в views.py
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_feed_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx',
+            ),
+        ]
 
     def __str__(self):
         """Метод, который возвращает строковое представление объекта."""
@@ -63,7 +123,7 @@ class Post(models.Model):
 
 class Comment(models.Model):
     text = models.TextField(verbose_name='Текст комментария')
-    created = models.DateTimeField(
+    created = CreatedField(
         auto_now_add=True,
         verbose_name='Дата комментарии'
     )
@@ -84,6 +144,12 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -95,3 +161,152 @@ class Follow(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name="following")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='no_self_follow',
+            ),
+        ]
+
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, поддерживаемые при записи."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.posts_count}'
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: строка на (подписчик, пост)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_feed_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} <- {self.post_id}'
+
+
+class Suggestion(models.Model):
+    """Кого почитать: рекомендация автора пользователю (suggestions.py)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        verbose_name='Пользователь',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рекомендуемый автор',
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        unique_together = ('user', 'author')
+        indexes = [
+            models.Index(
+                fields=['user', '-score'], name='suggestion_user_score_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.author_id}: {self.score:.2f}'
+
+
+class TrendingScore(models.Model):
+    """Оценка поста для ленты популярного (trending.py)."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Пост',
+    )
+    score = models.FloatField('Оценка', default=0)
+
+    class Meta:
+        verbose_name = 'Оценка популярности'
+        verbose_name_plural = 'Оценки популярности'
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.2f}'
+
+
+class Notification(models.Model):
+    """Новый пост автора для подписчика; уходит в дайджесте по почте."""
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name='Получатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост',
+    )
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    sent_at = models.DateTimeField('Отправлено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        unique_together = ('recipient', 'post')
+        indexes = [
+            models.Index(
+                fields=['sent_at', 'recipient'],
+                name='notification_unsent_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient_id} <- {self.post_id}'
@@ -0,0 +1,136 @@
+"""Письма подписчикам о новых постах, собранные в дайджесты.
+
+Новый пост ставит задачу fan_out в той же транзакции (core.jobs), так
+что запрос не ждёт ни обхода подписчиков, ни почты. fan_out проходит
+подписки автора пачками по BATCH_SIZE по ключу Follow.pk и записывает
+Notification для каждого подписчика с адресом; уникальность
+(получатель, пост) делает повторный запуск безвредным.
+
+Письмо на каждый пост не уходит: send_digests не чаще раза в
+NOTIFICATION_DIGEST_INTERVAL собирает неотправленные уведомления в одно
+письмо на получателя. Письма пачки уходят через одно соединение
+(core.mail.delivery_connection, как в send_mass_mail), но уведомления
+каждого письма отмечаются отправленными сразу после его отправки. Если
+отправка упала посередине, повтор задачи отправит только оставшиеся
+письма; повторно может уйти разве что одно письмо, отправленное перед
+самым падением процесса. Одновременно идёт только одна рассылка.
+"""
+import logging
+import smtplib
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.template.loader import get_template
+from django.utils import timezone
+
+from core import jobs
+from core.mail import delivery_connection
+
+from .models import Follow, Notification, Post
+
+BATCH_SIZE = 500
+# Больше постов в письме не перечисляем, остальные — ссылкой на ленту
+DIGEST_SIZE = 20
+SUBJECT = 'Новые посты в Yatube'
+_LOCK_KEY = 'posts:notifications:sending'
+
+logger = logging.getLogger(__name__)
+
+
+def post_created(post):
+    jobs.enqueue(fan_out, post.pk)
+
+
+@jobs.task()
+def fan_out(post_id):
+    """Записывает уведомления о посте всем подписчикам автора."""
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return 0
+    follows = Follow.objects.filter(
+        author_id=author_id, user__is_active=True,
+    ).exclude(user__email='').order_by('pk').values_list('pk', 'user_id')
+    total = 0
+    last = 0
+    while True:
+        chunk = list(follows.filter(pk__gt=last)[:BATCH_SIZE])
+        if not chunk:
+            break
+        Notification.objects.bulk_create(
+            [Notification(recipient_id=user_id, post_id=post_id)
+             for _, user_id in chunk],
+            ignore_conflicts=True,
+        )
+        total += len(chunk)
+        last = chunk[-1][0]
+    if total:
+        jobs.enqueue_once(
+            send_digests, delay=settings.NOTIFICATION_DIGEST_INTERVAL
+        )
+    return total
+
+
+def digest(template, recipient, notifications):
+    """Письмо-дайджест получателю о постах из notifications."""
+    posts = [notification.post for notification in notifications]
+    body = template.render({
+        'recipient': recipient,
+        'posts': posts[:DIGEST_SIZE],
+        'more': max(len(posts) - DIGEST_SIZE, 0),
+        'site_url': settings.SITE_URL,
+    })
+    return EmailMessage(SUBJECT, body, to=[recipient.email])
+
+
+@jobs.task()
+def send_digests():
+    """Рассылает накопленные уведомления; возвращает число писем."""
+    if not cache.add(_LOCK_KEY, True, settings.JOB_TIMEOUT):
+        # Рассылка уже идёт; то, что она не взяла, уйдёт следующей
+        jobs.enqueue_once(
+            send_digests, delay=settings.NOTIFICATION_DIGEST_INTERVAL
+        )
+        return 0
+    try:
+        return _send_digests()
+    finally:
+        cache.delete(_LOCK_KEY)
+
+
+def _send_digests():
+    template = get_template('posts/email/digest.txt')
+    unsent = Notification.objects.filter(
+        sent_at__isnull=True, created__lte=timezone.now(),
+    )
+    sent = 0
+    while True:
+        recipients = list(
+            unsent.order_by('recipient_id')
+            .values_list('recipient_id', flat=True)
+            .distinct()[:BATCH_SIZE]
+        )
+        if not recipients:
+            return sent
+        batch = unsent.filter(recipient_id__in=recipients).select_related(
+            'recipient', 'post__author'
+        ).order_by('recipient_id', '-post__pub_date')
+        with delivery_connection() as connection:
+            for _, rows in groupby(batch, key=lambda row: row.recipient_id):
+                rows = list(rows)
+                try:
+                    sent += connection.send_messages(
+                        [digest(template, rows[0].recipient, rows)]
+                    )
+                except smtplib.SMTPRecipientsRefused:
+                    # Адрес не принимают: повтор не поможет, а остановка
+                    # задержала бы рассылку всем остальным
+                    logger.warning(
+                        'Адрес %s отклонён', rows[0].recipient.email
+                    )
+                Notification.objects.filter(
+                    pk__in=[row.pk for row in rows]
+                ).update(sent_at=timezone.now())
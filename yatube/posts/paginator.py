@@ -0,0 +1,210 @@
+"""Курсорная (keyset) пагинация лент постов.
+
+Вместо OFFSET и COUNT(*) страница выбирается по паре (дата, id)
+последней записи предыдущей страницы, поэтому глубокие страницы
+стоят столько же, сколько первая.
+"""
+import base64
+import json
+from collections.abc import Sequence
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from yatube.settings import COUNT_POST_FOR_PAGE
+
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+
+def encode_cursor(direction, value=None, pk=None):
+    """Упаковывает позицию в непрозрачный токен для ?cursor=."""
+    payload = {'d': direction}
+    if value is not None:
+        payload['v'] = value.isoformat()
+        payload['i'] = pk
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode())
+        direction = payload['d']
+        if direction == LAST:
+            return direction, None, None
+        if direction not in (NEXT, PREVIOUS):
+            return None
+        value = parse_datetime(payload['v'])
+        pk = int(payload['i'])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+    if value is None:
+        return None
+    return direction, value, pk
+
+
+def _field(obj, name):
+    # Строки из .values() — словари, а не модели
+    return obj[name] if isinstance(obj, dict) else getattr(obj, name)
+
+
+class CursorPage(Sequence):
+    """Страница с тем же интерфейсом, что и django.core.paginator.Page."""
+
+    def __init__(self, rows, paginator, has_next, has_previous):
+        # rows нужны для курсоров, object_list — для шаблона
+        self.rows = rows
+        self.object_list = paginator.transform(rows)
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage ({len(self)} objects)>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.cursor_for(NEXT, self.rows[-1])
+
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.cursor_for(PREVIOUS, self.rows[0])
+
+    def last_cursor(self):
+        return encode_cursor(LAST)
+
+
+class CursorPaginator:
+    """Пагинатор по убыванию (field, pk) без COUNT(*) и OFFSET.
+
+    Ожидает, что для queryset есть индекс, совпадающий с сортировкой,
+    иначе выигрыша не будет. transform превращает выбранные строки
+    в объекты для шаблона (например, записи ленты в посты).
+    """
+
+    def __init__(self, queryset, per_page, field='pub_date', pk_field='id',
+                 transform=list):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.field = field
+        self.pk_field = pk_field
+        self.transform = transform
+
+    def cursor_for(self, direction, obj):
+        return encode_cursor(
+            direction,
+            _field(obj, self.field),
+            _field(obj, self.pk_field),
+        )
+
+    def _ordered(self, descending=True):
+        sign = '-' if descending else ''
+        return self.queryset.order_by(
+            sign + self.field, sign + self.pk_field
+        )
+
+    def _after(self, value, pk):
+        """Условие «строго старше позиции курсора».
+
+        Отдельное field <= value даёт планировщику границу диапазона
+        по индексу, а не фильтр поверх полного прохода.
+        """
+        return Q(**{f'{self.field}__lte': value}) & (
+            Q(**{f'{self.field}__lt': value})
+            | Q(**{f'{self.pk_field}__lt': pk})
+        )
+
+    def _before(self, value, pk):
+        """Условие «строго новее позиции курсора»."""
+        return Q(**{f'{self.field}__gte': value}) & (
+            Q(**{f'{self.field}__gt': value})
+            | Q(**{f'{self.pk_field}__gt': pk})
+        )
+
+    def first_page(self):
+        rows = list(self._ordered()[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], self, has_next, False)
+
+    def page_by_number(self, number):
+        """Совместимость со старыми ссылками вида ?page=N."""
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        if number == 1:
+            return self.first_page()
+        offset = (number - 1) * self.per_page
+        rows = list(self._ordered()[offset:offset + self.per_page + 1])
+        if not rows:
+            return self.last_page()
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], self, has_next, True)
+
+    def last_page(self):
+        rows = list(self._ordered(descending=False)[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(rows, self, False, has_previous)
+
+    def page_by_cursor(self, direction, value, pk):
+        if direction == LAST:
+            return self.last_page()
+        if direction == NEXT:
+            rows = list(
+                self._ordered().filter(
+                    self._after(value, pk))[:self.per_page + 1]
+            )
+            has_next = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page], self, has_next, True)
+        rows = list(
+            self._ordered(descending=False).filter(
+                self._before(value, pk))[:self.per_page + 1]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        if not has_previous:
+            # Дошли до начала ленты: отдаём полноценную первую страницу.
+            return self.first_page()
+        return CursorPage(rows, self, True, has_previous)
+
+    def get_page(self, cursor=None, page_number=None):
+        """Возвращает страницу; битый курсор ведёт на первую страницу."""
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is not None:
+                return self.page_by_cursor(*position)
+        if page_number:
+            return self.page_by_number(page_number)
+        return self.first_page()
+
+
+def paginate(request, queryset, per_page=COUNT_POST_FOR_PAGE, **kwargs):
+    """Страница для запроса по ?cursor= (или устаревшему ?page=)."""
+    paginator = CursorPaginator(queryset, per_page, **kwargs)
+    return paginator.get_page(
+        request.GET.get('cursor'), request.GET.get('page')
+    )
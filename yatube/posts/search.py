@@ -0,0 +1,183 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс posts_post_fts хранит только токены (external content), сам текст
+читается из posts_post. Индекс поддерживают триггеры, поэтому в него
+попадают и bulk_create, и queryset.update(). При пересоздании таблицы
+posts_post миграцией SQLite удаляет её триггеры, поэтому install()
+вызывается после каждого migrate и создаёт недостающие.
+"""
+import re
+from collections.abc import Sequence
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+TABLE = 'posts_post_fts'
+
+SCHEMA = f'''
+CREATE VIRTUAL TABLE {TABLE} USING fts5(
+    text,
+    content='posts_post',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+'''
+
+TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO {TABLE} ({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_au
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO {TABLE} ({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+    END""",
+)
+
+WORD = re.compile(r'\w+')
+MAX_TERMS = 8
+# Короткий префикс совпадает почти со всем корпусом, и ранжирование
+# таких запросов занимает секунды — ищем по префиксу от трёх символов
+MIN_PREFIX = 3
+# Сколько самых свежих совпадений ранжируется и доступно по страницам
+MAX_RESULTS = 1000
+
+
+def install(using=connection):
+    """Создаёт индекс и триггеры, если их нет. Возвращает True, если
+    индекс пришлось построить заново."""
+    if using.vendor != 'sqlite':
+        return False
+    with using.cursor() as cursor:
+        created = TABLE not in using.introspection.table_names(cursor)
+        if created:
+            cursor.execute(SCHEMA)
+        for sql in TRIGGERS:
+            cursor.execute(sql)
+        if created:
+            cursor.execute(
+                f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')"
+            )
+    return created
+
+
+def rebuild(using=connection):
+    """Перестраивает индекс по текущему содержимому posts_post."""
+    with using.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')")
+
+
+def build_query(text):
+    """Переводит ввод пользователя в запрос FTS5.
+
+    Слова берутся в кавычки, поэтому операторы и спецсимволы FTS5 из
+    ввода не интерпретируются; последнее слово ищется по префиксу.
+    """
+    terms = WORD.findall(text or '')[:MAX_TERMS]
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= MIN_PREFIX:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def matching_ids(query):
+    """Подзапрос с id постов, подходящих под запрос FTS5."""
+    return RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [query]
+    )
+
+
+class SearchPage(Sequence):
+    """Страница результатов: номер и соседние страницы, без общего числа."""
+
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f'<SearchPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class SearchResults:
+    """Результаты поиска по релевантности (bm25).
+
+    bm25 считается для каждого совпадения, и сортировка по нему обходит
+    все совпадения: для частого слова это весь корпус. Поэтому
+    ранжируются только MAX_RESULTS самых свежих совпадений (индекс
+    отдаёт их по rowid без сортировки), а общее число не считается.
+    Срез выбирает из индекса только id нужной страницы, затем посты
+    страницы читаются одним запросом.
+    """
+
+    def __init__(self, text, queryset=None):
+        self.query = build_query(text)
+        self.queryset = (
+            queryset if queryset is not None
+            else Post.objects.select_related('author', 'group')
+        )
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        stop = MAX_RESULTS if item.stop is None else min(
+            item.stop, MAX_RESULTS
+        )
+        if not self.query or stop <= start:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM ('
+                f'SELECT rowid, rank FROM {TABLE} WHERE {TABLE} MATCH %s '
+                'ORDER BY rowid DESC LIMIT %s'
+                ') ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [self.query, MAX_RESULTS, stop - start, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def page(self, number, per_page):
+        """Страница number (с 1); лишняя строка показывает, есть ли дальше."""
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        start = (number - 1) * per_page
+        rows = self[start:start + per_page + 1]
+        return SearchPage(rows[:per_page], number, len(rows) > per_page)
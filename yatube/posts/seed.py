@@ -0,0 +1,96 @@
+"""Воспроизводимый генератор большого набора данных для замеров.
+
+Записи отдаются в формате posts.importer и грузятся через Importer,
+поэтому производные данные строятся так же, как при импорте. Один и
+тот же seed на пустой базе даёт один и тот же набор.
+
+Распределения похожи на живой сайт: активность авторов и популярность
+в подписках подчиняются закону Ципфа, комментарии чаще достаются свежим
+постам. Самые активные и самые популярные авторы — разные люди: если
+их совместить, каждая лента подписок содержит большую часть всех
+постов и таблица Timeline раздувается на порядки.
+"""
+import itertools
+import random
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import User
+
+WORDS = (
+    'день ночь город лес море река горы дорога дом окно книга письмо '
+    'друг время работа отпуск поход кофе чай утро вечер снег дождь '
+    'солнце ветер поезд самолёт музыка фильм кино театр выставка '
+    'картина фото кот собака сад огород рецепт пирог суп новость '
+    'история память мысль идея проект код ошибка релиз тест сервер'
+).split()
+
+# Посты равномерно распределены по этому отрезку до текущего момента
+SPAN = timedelta(days=3 * 365)
+
+
+def _zipf_weights(count, exponent=1.1):
+    return list(itertools.accumulate(
+        1 / (rank ** exponent) for rank in range(1, count + 1)
+    ))
+
+
+def usernames(count):
+    return [f'user{i}' for i in range(count)]
+
+
+def create_users(count):
+    """Создаёт всех пользователей заранее, включая тех, у кого нет записей."""
+    User.objects.bulk_create(
+        (User(username=name, password='!') for name in usernames(count)),
+        ignore_conflicts=True,
+    )
+
+
+def _text(rng):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(5, 60)))
+
+
+def records(users, posts, comments, groups, follows, seed=0):
+    """Генерирует посты, затем комментарии, затем подписки."""
+    rng = random.Random(seed)
+    names = usernames(users)
+    weights = _zipf_weights(users)
+    start = timezone.now() - SPAN
+    step = SPAN / max(posts, 1)
+
+    def pub_date(index):
+        return start + step * index
+
+    for index in range(posts):
+        author, = rng.choices(names, cum_weights=weights)
+        record = {
+            'id': index,
+            'author': author,
+            'text': _text(rng),
+            'pub_date': pub_date(index).isoformat(),
+        }
+        if groups and rng.random() < 0.7:
+            record['group'] = f'group{rng.randrange(groups)}'
+        yield record
+
+    for _ in range(comments if posts else 0):
+        # Смещение к концу диапазона: свежие посты комментируют чаще
+        index = min(int(posts * (1 - rng.random() ** 3)), posts - 1)
+        yield {
+            'type': 'comment',
+            'post': index,
+            'author': rng.choice(names),
+            'text': _text(rng),
+            'created': (
+                pub_date(index) + timedelta(minutes=rng.randint(1, 600))
+            ).isoformat(),
+        }
+
+    popular = names[:]
+    rng.shuffle(popular)
+    for name in names:
+        count = min(int(rng.expovariate(1 / follows)), users - 1)
+        for author in set(rng.choices(popular, cum_weights=weights, k=count)):
+            yield {'type': 'follow', 'user': name, 'author': author}
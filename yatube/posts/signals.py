@@ -0,0 +1,103 @@
+"""Обработчики сигналов, поддерживающие производные данные постов."""
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import (cache, counters, notifications, suggestions, thumbnails,
+               timeline, trending)
+from .models import Comment, Follow, Group, Post, User
+
+
+def _invalidate_follow(follow):
+    usernames = User.objects.filter(
+        pk__in=(follow.user_id, follow.author_id)
+    ).values_list('username', flat=True)
+    cache.invalidate(*(cache.profile_scope(name) for name in usernames))
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Запоминаем группу, чтобы при смене перенести счётчик,
+    # и картинку, чтобы строить миниатюры только для новой
+    # Отложенные поля (.only/.defer) не трогаем: их чтение — запрос,
+    # а save() их не пишет, так что и переносить нечего
+    values = instance.__dict__
+    instance._loaded_group_id = values.get('group_id', DEFERRED)
+    image = values.get('image', DEFERRED)
+    instance._loaded_image = getattr(image, 'name', image)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_author(instance.author_id, 'posts_count', 1)
+        counters.bump_group(instance.group_id, 1)
+        timeline.fan_out_post(instance)
+        trending.post_created(instance)
+        notifications.post_created(instance)
+    elif (instance._loaded_group_id is not DEFERRED
+            and instance.group_id != instance._loaded_group_id):
+        counters.bump_group(instance._loaded_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+    if instance._loaded_group_id is DEFERRED:
+        cache.invalidate_post(instance, instance.group_id)
+    else:
+        cache.invalidate_post(
+            instance, instance.group_id, instance._loaded_group_id
+        )
+        instance._loaded_group_id = instance.group_id
+    if instance._loaded_image is not DEFERRED:
+        if instance.image and instance.image.name != instance._loaded_image:
+            thumbnails.schedule(instance)
+        instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'posts_count', -1)
+    counters.bump_group(instance.group_id, -1)
+    cache.invalidate_post(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_post(instance.post_id, 1)
+        trending.comment_added(instance.post_id)
+    cache.invalidate(cache.post_scope(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    cache.invalidate(cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    # Название группы выводится на всех лентах: сбрасываем всё
+    if not raw:
+        cache.invalidate(cache.GLOBAL)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_author(instance.author_id, 'followers_count', 1)
+        counters.bump_author(instance.user_id, 'following_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        suggestions.forget(instance.user_id, instance.author_id)
+        _invalidate_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'followers_count', -1)
+    counters.bump_author(instance.user_id, 'following_count', -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    _invalidate_follow(instance)
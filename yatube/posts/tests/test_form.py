@@ -1,6 +1,13 @@
 # posts/tests/test_views.py
-from django.test import Client, TestCase
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Group, Post, User
@@ -126,3 +133,63 @@ class PostPagesTests(TestCase):
                 group=self.group.id
             ).exists()
         )
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=100)
+class PostImageFormTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='image_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, content, name='photo.jpg'):
+        self.client.post(CREATE_POST_URL, data={
+            'text': name,
+            'image': SimpleUploadedFile(name, content, 'image/jpeg'),
+        })
+        return Post.objects.get(text=name).image.name
+
+    def make_jpeg(self, size=(400, 200)):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повернуть на 90°
+        exif[0x010F] = 'camera'
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+        return buffer.getvalue()
+
+    def test_image_is_normalized(self):
+        """Картинка повёрнута по EXIF, уменьшена и без метаданных."""
+        name = self.upload(self.make_jpeg())
+        with default_storage.open(name) as stored:
+            image = Image.open(stored)
+            self.assertEqual(image.size, (50, 100))
+            self.assertFalse(image.getexif())
+
+    def test_same_image_stored_once(self):
+        """Повторная загрузка того же файла не создаёт копию."""
+        content = self.make_jpeg()
+        first = self.upload(content, 'first.jpg')
+        second = self.upload(content, 'second.jpg')
+        self.assertEqual(first, second)
+
+    def test_broken_image_rejected(self):
+        form = PostForm(
+            data={'text': 'broken'},
+            files={'image': SimpleUploadedFile(
+                'broken.jpg', b'not an image', 'image/jpeg'
+            )},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -1,7 +1,19 @@
+import json
+import tempfile
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from ..models import Group, Post
+from ..counters import get_stats
+from ..models import AuthorStats, Comment, Follow, Group, Post, Timeline
+from ..search import SearchResults
+from yatube.settings import COUNT_POST_FOR_PAGE
 
 User = get_user_model()
 
@@ -54,3 +66,260 @@ class PostModelTest(TestCase):
         p4 = PostModelTest.group.title
         self.assertEqual(p1, p2, 'post error')
         self.assertEqual(p3, p4, 'group error')
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='other', description='Описание'
+        )
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.group.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(get_stats(self.author.pk).posts_count, 1)
+        self.assertEqual(get_stats(self.author.pk).followers_count, 1)
+        self.assertEqual(get_stats(self.reader.pk).following_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        # Перенос поста в другую группу переносит и счётчик
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        follow.delete()
+        post.delete()
+        self.assertEqual(get_stats(self.author.pk).posts_count, 0)
+        self.assertEqual(get_stats(self.author.pk).followers_count, 0)
+        self.assertEqual(get_stats(self.reader.pk).following_count, 0)
+
+    def test_save_keeps_concurrent_counter_bumps(self):
+        """Сохранение прочитанного раньше объекта не откатывает счётчики."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        group = Group.objects.get(pk=self.group.pk)
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        Post.objects.create(author=self.author, group=self.group, text='Ещё')
+        stale.text = 'Исправленный пост'
+        stale.save()
+        group.title = 'Переименованная'
+        group.save()
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.title, 'Переименованная')
+        self.assertEqual(self.group.posts_count, 2)
+
+    def test_save_with_deferred_group_keeps_counters(self):
+        """Пост, загруженный без группы, не переносит счётчик при save()."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        partial = Post.objects.only('text').get(pk=post.pk)
+        partial.text = 'Исправленный пост'
+        partial.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.group_id, self.group.pk)
+
+    def test_reconcile_counters_repairs_drift(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        AuthorStats.objects.all().delete()
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=0)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.group.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(get_stats(self.author.pk).posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+
+class FeedQueryPlanTest(TestCase):
+    """Ленты не должны читать таблицы целиком или сортировать во временном
+    B-дереве: каждый запрос обязан идти по индексу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for i in range(COUNT_POST_FOR_PAGE + 3):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def assert_indexed(self, url, key='page_obj'):
+        first = self.client.get(url).context[key]
+        urls = (url, f'{url}?cursor={first.next_cursor()}')
+        for address in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(address)
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plan = [row[-1] for row in cursor.fetchall()]
+                with self.subTest(address=address, sql=sql):
+                    for step in plan:
+                        self.assertNotIn('TEMP B-TREE', step)
+                        if step.startswith('SCAN'):
+                            self.assertIn('USING', step)
+
+    def test_feeds_use_indexes(self):
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                self.assert_indexed(url)
+
+    def test_comments_use_index(self):
+        post = Post.objects.filter(author=self.author).first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.reader, text=f'Комментарий {i}')
+            for i in range(30)
+        )
+        self.assert_indexed(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            key='comments',
+        )
+
+
+class ImportPostsTest(TestCase):
+    def import_records(self, records, *args):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.jsonl', encoding='utf-8'
+        ) as source:
+            for record in records:
+                if not isinstance(record, str):
+                    record = json.dumps(record, ensure_ascii=False)
+                source.write(record + '\n')
+            source.flush()
+            out = StringIO()
+            call_command(
+                'import_posts', source.name, '--batch-size', '2', *args,
+                stdout=out,
+            )
+        return out.getvalue()
+
+    def test_import_rebuilds_derived_data(self):
+        reader = User.objects.create_user(username='reader')
+        output = self.import_records([
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+            {'id': 'a', 'author': 'writer', 'group': 'hikes',
+             'text': 'Импортированный поход', 'pub_date': '2015-05-01T10:00'},
+            {'id': 'b', 'author': 'writer', 'text': 'Второй пост'},
+            {'type': 'comment', 'post': 'a', 'author': 'reader',
+             'text': 'Отличный пост', 'created': '2015-05-02T10:00'},
+            {'type': 'comment', 'post': 'missing', 'author': 'reader',
+             'text': 'Потерянный'},
+            {'author': 'writer'},
+        ], '--create-missing')
+        self.assertIn('пропущено: 2', output)
+        writer = User.objects.get(username='writer')
+        post = Post.objects.get(text='Импортированный поход')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group.slug, 'hikes')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().created.year, 2015)
+        self.assertEqual(post.group.posts_count, 1)
+        self.assertEqual(get_stats(writer.pk).posts_count, 2)
+        self.assertEqual(get_stats(writer.pk).followers_count, 1)
+        self.assertEqual(
+            Timeline.objects.filter(user=reader).count(), 2
+        )
+        self.assertEqual(list(SearchResults('поход')[:10]), [post])
+
+    def test_comments_follow_database_ids(self):
+        """id постов выдаёт база, даже если последние id уже были заняты."""
+        author = User.objects.create_user(username='writer')
+        Post.objects.create(author=author, text='Удалённый').delete()
+        self.import_records([
+            {'id': 'a', 'author': 'writer', 'text': 'Первый'},
+            {'id': 'b', 'author': 'writer', 'text': 'Второй'},
+            {'type': 'comment', 'post': 'b', 'author': 'writer',
+             'text': 'Ко второму'},
+        ])
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post.text, 'Второй')
+
+    def test_updates_only_touched_rows(self):
+        """Загрузка дополняет ленты и счётчики, не пересобирая таблицы."""
+        writer = User.objects.create_user(username='writer')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=writer)
+        Post.objects.create(author=writer, text='Старый пост')
+        with CaptureQueriesContext(connection) as context:
+            self.import_records([
+                {'author': 'writer', 'text': 'Новый пост'},
+                {'type': 'follow', 'user': 'fan', 'author': 'writer'},
+            ], '--create-missing')
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].startswith('DELETE FROM "posts_timeline"')
+        ])
+        fan = User.objects.get(username='fan')
+        for user in (reader, fan):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    Timeline.objects.filter(user=user).count(), 2
+                )
+        self.assertEqual(get_stats(writer.pk).posts_count, 2)
+        self.assertEqual(get_stats(writer.pk).followers_count, 2)
+        self.assertEqual(get_stats(fan.pk).following_count, 1)
+
+    def test_bad_records_skipped(self):
+        """Испорченные строки пропускаются, а не обрывают загрузку."""
+        output = self.import_records([
+            {'author': 'writer', 'text': 'До'},
+            {'author': 'writer', 'text': 'Дата', 'pub_date': '2015-13-01'},
+            '{"author": "writer", "text": ',
+            {'author': 'writer', 'text': None},
+            '[1, 2]',
+            {'type': 'follow', 'user': None, 'author': 'writer'},
+            {'author': 'writer', 'text': 'После'},
+        ], '--create-missing')
+        self.assertIn('пропущено: 5', output)
+        self.assertEqual(
+            set(Post.objects.values_list('text', flat=True)), {'До', 'После'}
+        )
+
+    def test_unknown_authors_skipped_without_flag(self):
+        output = self.import_records([{'author': 'nobody', 'text': 'x'}])
+        self.assertIn('пропущено: 1', output)
+        self.assertFalse(Post.objects.exists())
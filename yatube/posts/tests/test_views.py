@@ -1,15 +1,33 @@
 # posts/tests/test_views.py
+import json
+import tempfile
+from io import StringIO
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+
 from genericpath import exists
 from django import forms
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase
-from django.urls import reverse
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core import mail
+from django.core.mail.backends import locmem
 
+from core.models import Job
+from core.query_budget import assert_max_queries
+from posts import (notifications, search, suggestions, thumbnails,
+                   trending)
+from posts.cache import STATS
 from posts.forms import PostForm
-from posts.models import Follow, Group, Post, User, Comment
+from posts.models import (Comment, Follow, Group, Notification, Post,
+                          Suggestion, Timeline, TrendingScore, User)
 
-from yatube.settings import COUNT_POST_FOR_PAGE
+from yatube.settings import COMMENTS_PER_PAGE, COUNT_POST_FOR_PAGE
 
 TEST_AUTOR = 'author_test'
 GROUP_SLUG = 'slug_test'
@@ -291,16 +309,92 @@ class PostPagesTests(TestCase):
         old_create_post = self.authorized_client.get(
             reverse('posts:index'))
         first_item_before = old_create_post.content
+        hits = STATS['hits']
+        # Повторный запрос без изменений отдаётся из кэша
+        cached = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(cached.content, first_item_before)
+        self.assertEqual(STATS['hits'], hits + 1)
+        # Новый пост сразу сбрасывает версию ленты
         Post.objects.create(
             author=self.author,
-            text='Тестовый текст',
+            text='Свежий текст для кэша',
             group=self.group)
         after_create_post = self.authorized_client.get(reverse('posts:index'))
-        first_item_after = after_create_post.content
-        self.assertEqual(first_item_after, first_item_before)
-        cache.clear()
-        after_clear = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(first_item_after, after_clear)
+        self.assertNotEqual(after_create_post.content, first_item_before)
+        self.assertContains(after_create_post, 'Свежий текст для кэша')
+
+    def test_thumbnail_placeholder_until_built(self):
+        """Пока миниатюры нет, выводится заглушка; после сборки — картинка."""
+        response = self.authorized_client.get(self.POST_DETAIL_URL)
+        self.assertContains(response, 'Картинка готовится')
+        thumbnails.build(self.post)
+        self.assertIsNotNone(thumbnails.lookup(self.post.image, 'card'))
+        response = self.authorized_client.get(self.POST_DETAIL_URL)
+        self.assertNotContains(response, 'Картинка готовится')
+        self.assertContains(response, '<img class="card-img my-2"')
+
+    def test_group_change_invalidates_profile(self):
+        """Изменение группы сбрасывает кэш профиля автора."""
+        self.authorized_client.get(PROFILE_URL)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Переименованная группа'
+        group.save()
+        response = self.authorized_client.get(PROFILE_URL)
+        self.assertContains(response, 'Переименованная группа')
+
+    def test_post_cards_reused_between_feeds(self):
+        """Карточки, отрисованные для одной ленты, берутся из кэша в другой."""
+        STATS.clear()
+        self.authorized_client.get(INDEX_URL)
+        self.assertEqual(STATS['card_misses'], 2)
+        self.authorized_client.get(PROFILE_URL)
+        self.assertEqual(STATS['card_misses'], 2)
+        self.assertEqual(STATS['card_hits'], 2)
+
+    def test_post_card_follows_post_edit(self):
+        """Изменение текста поста меняет его карточку в ленте."""
+        self.authorized_client.get(GROUP_URL)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.authorized_client.get(GROUP_URL)
+        self.assertContains(response, 'Исправленный текст')
+
+    def test_post_card_dropped_after_thumbnail(self):
+        """После сборки миниатюры карточка в ленте перерисовывается."""
+        response = self.authorized_client.get(INDEX_URL)
+        self.assertContains(response, 'Картинка готовится')
+        # Миниатюры строит задача, поставленная при сохранении поста
+        call_command(
+            'run_workers', queues=['thumbnails'], burst=True,
+            stdout=StringIO(),
+        )
+        response = self.authorized_client.get(INDEX_URL)
+        self.assertNotContains(response, 'Картинка готовится')
+
+    def test_generate_thumbnails_drops_cards(self):
+        """Команда generate_thumbnails перерисовывает карточки в лентах."""
+        response = self.authorized_client.get(INDEX_URL)
+        self.assertContains(response, 'Картинка готовится')
+        thumbnails.generate(self.post.image.name)
+        call_command('generate_thumbnails', processes=1, stdout=StringIO())
+        response = self.authorized_client.get(INDEX_URL)
+        self.assertNotContains(response, 'Картинка готовится')
+
+    def test_cache_stats_for_staff_only(self):
+        """Статистика кэша доступна только персоналу."""
+        url = reverse('posts:cache_stats')
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.authorized_client.force_login(staff)
+        response = self.authorized_client.get(url)
+        self.assertEqual(
+            set(response.json()),
+            {'hits', 'misses', 'invalidations', 'not_modified',
+             'card_hits', 'card_misses'},
+        )
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -375,6 +469,580 @@ class PaginatorViewsTest(TestCase):
         )
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages_cover_feed_once(self):
+        """Курсоры проходят ленту без пропусков и повторов."""
+        cache.clear()
+        response = self.authorized_client.get(INDEX_URL)
+        page_obj = response.context['page_obj']
+        seen = [post.pk for post in page_obj]
+        self.assertFalse(page_obj.has_previous())
+        response = self.authorized_client.get(
+            INDEX_URL, {'cursor': page_obj.next_cursor()}
+        )
+        page_obj = response.context['page_obj']
+        seen += [post.pk for post in page_obj]
+        self.assertFalse(page_obj.has_next())
+        self.assertTrue(page_obj.has_previous())
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'pk', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        # Возврат назад даёт первую страницу целиком
+        response = self.authorized_client.get(
+            INDEX_URL, {'cursor': page_obj.previous_cursor()}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            expected[:COUNT_POST_FOR_PAGE]
+        )
+
+    def test_last_and_broken_cursor(self):
+        """Последняя страница и битый курсор обрабатываются без ошибок."""
+        response = self.authorized_client.get(GROUP_URL)
+        last = response.context['page_obj'].last_cursor()
+        response = self.authorized_client.get(GROUP_URL, {'cursor': last})
+        page_obj = response.context['page_obj']
+        # Последняя страница — самые старые записи ленты
+        self.assertFalse(page_obj.has_next())
+        self.assertEqual(
+            page_obj[len(page_obj) - 1],
+            Post.objects.order_by('pub_date', 'id').first()
+        )
+        response = self.authorized_client.get(
+            PROFILE_URL, {'cursor': 'not-a-cursor'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), COUNT_POST_FOR_PAGE
+        )
+
+    def test_cursor_page_skips_count(self):
+        """Страница по курсору не делает COUNT(*)."""
+        cache.clear()
+        page_obj = self.authorized_client.get(
+            INDEX_URL).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(
+                INDEX_URL, {'cursor': page_obj.next_cursor()}
+            )
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+            self.assertNotIn('OFFSET', query['sql'].upper())
+
+
+class QueryBudgetTests(TestCase):
+    """Каждая страница укладывается в бюджет запросов своего view."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='group_test', slug=GROUP_SLUG, description='descr_test'
+        )
+        cls.author = User.objects.create_user(username=TEST_AUTOR)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post_with_comments = Post.objects.create(
+            author=cls.author, group=cls.group, text='commented'
+        )
+        for i in range(COUNT_POST_FOR_PAGE + 3):
+            # У каждого поста своя группа, у каждого комментария свой автор
+            group = Group.objects.create(
+                title=f'group_{i}', slug=f'group_{i}', description='-'
+            )
+            Post.objects.create(
+                author=cls.author, group=group, text=f'text {i}'
+            )
+            commenter = User.objects.create_user(username=f'user_{i}')
+            Comment.objects.create(
+                post=cls.post_with_comments, author=commenter,
+                text=f'comment {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def test_views_fit_query_budget(self):
+        post_id = self.post_with_comments.pk
+        urls = (
+            INDEX_URL,
+            GROUP_URL,
+            PROFILE_URL,
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': post_id}),
+            reverse('posts:post_comments', kwargs={'post_id': post_id}),
+            reverse('posts:post_edit', kwargs={'post_id': post_id}),
+            CREATE_POST_URL,
+            reverse('posts:search') + '?q=text',
+        )
+        for url in urls:
+            if url == reverse('posts:follow_index'):
+                self.client.force_login(self.reader)
+            budget = resolve(url.split('?')[0]).func.query_budget
+            with self.subTest(url=url):
+                with assert_max_queries(budget, url):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+            self.client.force_login(self.author)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=TEST_AUTOR)
+        cls.group = Group.objects.create(
+            title='group_test', slug=GROUP_SLUG, description='descr_test'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_not_modified(self, url):
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_unchanged_pages_return_304(self):
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL, self.detail_url):
+            with self.subTest(url=url):
+                self.assert_not_modified(url)
+
+    def test_changes_invalidate_etag(self):
+        changes = (
+            (INDEX_URL, lambda: Post.objects.create(
+                author=self.author, text='Новый')),
+            (self.detail_url, lambda: Comment.objects.create(
+                post=self.post, author=self.author, text='Комментарий')),
+        )
+        for url, change in changes:
+            with self.subTest(url=url):
+                etag = self.assert_not_modified(url)
+                change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_user(self):
+        etag = self.client.get(INDEX_URL)['ETag']
+        self.client.force_login(self.author)
+        response = self.client.get(INDEX_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_replica_page_not_cached_right_after_write(self):
+        """Страница с реплики сразу после записи не кэшируется."""
+        Post.objects.create(author=self.author, text='Новый')
+        STATS.clear()
+        self.client.get(INDEX_URL)
+        response = self.client.get(INDEX_URL)
+        self.assertEqual(STATS['hits'], 0)
+        self.assertFalse(response.has_header('ETag'))
+
+    @override_settings(DATABASE_REPLICAS=['default'], REPLICA_PIN_SECONDS=0)
+    def test_replica_page_cached_after_lag_window(self):
+        Post.objects.create(author=self.author, text='Новый')
+        STATS.clear()
+        self.client.get(INDEX_URL)
+        response = self.client.get(INDEX_URL)
+        self.assertEqual(STATS['hits'], 1)
+        self.assertTrue(response.has_header('ETag'))
+
+
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=TEST_AUTOR)
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    @override_settings(RATE_LIMITS={'add_comment': '2/m'})
+    def test_excess_writes_rejected(self):
+        """Лишний комментарий получает 429 и не попадает в базу."""
+        url = reverse('posts:add_comment', args=[self.post.pk])
+        for _ in range(2):
+            response = self.client.post(url, {'text': 'Комментарий'})
+            self.assertEqual(response.status_code, 302)
+        with assert_max_queries(2):
+            response = self.client.post(url, {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Comment.objects.count(), 2)
+
+    @override_settings(RATE_LIMITS={'add_comment': '1/m'})
+    def test_limits_are_per_user(self):
+        url = reverse('posts:add_comment', args=[self.post.pk])
+        self.client.post(url, {'text': 'Комментарий'})
+        self.client.force_login(User.objects.create_user(username='other'))
+        response = self.client.post(url, {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(RATE_LIMITS={'post_create': '1/m'})
+    def test_form_display_not_limited(self):
+        for _ in range(3):
+            response = self.client.get(CREATE_POST_URL)
+            self.assertEqual(response.status_code, 200)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username=TEST_AUTOR, first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='group_test', slug=GROUP_SLUG, description='descr_test'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(COUNT_POST_FOR_PAGE + 2)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sparse_fields(self):
+        url = reverse('api:post_list') + '?fields=text,author'
+        results = self.client.get(url).json()['results']
+        self.assertEqual(results[0], {
+            'text': self.post.text, 'author': TEST_AUTOR,
+        })
+
+    def test_lists_have_no_comments_count(self):
+        """Число комментариев есть только у поста: списки его не кэшируют."""
+        row = self.client.get(reverse('api:post_list')).json()['results'][0]
+        self.assertNotIn('comments_count', row)
+        response = self.client.get(
+            reverse('api:group_posts', args=[GROUP_SLUG])
+            + '?fields=comments_count'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_field_rejected(self):
+        response = self.client.get(reverse('api:post_list') + '?fields=x')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('x', response.json()['error'])
+
+    def test_cursor_pages(self):
+        """Курсор из next ведёт на следующую страницу без повторов."""
+        url = reverse('api:group_posts', args=[GROUP_SLUG]) + '?fields=id'
+        first = self.client.get(url).json()
+        second = self.client.get(f"{url}&cursor={first['next']}").json()
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+        self.assertIsNone(second['next'])
+
+    def test_objects(self):
+        cases = (
+            (reverse('api:post_detail', args=[self.post.pk]),
+             {'id': self.post.pk, 'group': GROUP_SLUG, 'comments_count': 1}),
+            (reverse('api:profile_detail', args=[TEST_AUTOR]),
+             {'last_name': 'Толстой', 'posts_count': len(self.posts),
+              'followers_count': 1}),
+            (reverse('api:group_detail', args=[GROUP_SLUG]),
+             {'title': 'group_test', 'posts_count': len(self.posts)}),
+        )
+        for url, expected in cases:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(
+                    {key: data[key] for key in expected}, expected
+                )
+
+    def test_missing_object_is_json_404(self):
+        response = self.client.get(reverse('api:post_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+
+    def test_follow_feed_requires_login(self):
+        url = reverse('api:follow_feed')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        results = self.client.get(url + '?fields=id').json()['results']
+        self.assertEqual(results[0], {'id': self.post.pk})
+
+    def test_cached_and_invalidated_with_pages(self):
+        """Ответ API кэшируется и сбрасывается вместе со страницами."""
+        url = reverse('api:comment_list', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(post=self.post, author=self.reader, text='Ещё')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_views_fit_query_budget(self):
+        urls = (
+            reverse('api:post_list'),
+            reverse('api:post_detail', args=[self.post.pk]),
+            reverse('api:comment_list', args=[self.post.pk]),
+            reverse('api:group_list'),
+            reverse('api:group_detail', args=[GROUP_SLUG]),
+            reverse('api:group_posts', args=[GROUP_SLUG]),
+            reverse('api:profile_detail', args=[TEST_AUTOR]),
+            reverse('api:profile_posts', args=[TEST_AUTOR]),
+            reverse('api:follow_feed'),
+        )
+        self.client.force_login(self.reader)
+        for url in urls:
+            budget = resolve(url).func.query_budget
+            with self.subTest(url=url):
+                with assert_max_queries(budget, url):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=TEST_AUTOR)
+        cls.group = Group.objects.create(
+            title='group_test', slug=GROUP_SLUG, description='descr_test'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост <b>& ленты'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self, fmt, name='posts:group_feed', arg=GROUP_SLUG):
+        return self.client.get(reverse(name, args=[arg, fmt]))
+
+    def read(self, response):
+        if response.streaming:
+            return b''.join(response.streaming_content).decode()
+        return response.content.decode()
+
+    def test_formats(self):
+        for fmt in ('rss', 'atom'):
+            with self.subTest(fmt=fmt):
+                body = self.read(self.feed(fmt))
+                self.assertIn('Пост &lt;b&gt;&amp; ленты', body)
+        data = json.loads(self.read(
+            self.feed('json', 'posts:profile_feed', TEST_AUTOR)
+        ))
+        self.assertEqual(data['items'][0]['content_text'], self.post.text)
+        self.assertEqual(self.feed('xml').status_code, 404)
+
+    def test_streamed_then_cached_and_invalidated(self):
+        first = self.feed('rss')
+        self.assertTrue(first.streaming)
+        self.read(first)
+        cached = self.feed('rss')
+        self.assertFalse(cached.streaming)
+        Post.objects.create(
+            author=self.author, group=self.group, text='Свежий пост'
+        )
+        fresh = self.feed('rss')
+        self.assertTrue(fresh.streaming)
+        self.assertIn('Свежий пост', self.read(fresh))
+
+    def test_conditional_get(self):
+        etag = self.feed('atom')['ETag']
+        response = self.client.get(
+            reverse('posts:group_feed', args=[GROUP_SLUG, 'atom']),
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_public_cache_headers(self):
+        """Лента общая: её могут хранить прокси, ETag не зависит от входа."""
+        response = self.feed('rss')
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.FEED_MAX_AGE}',
+        )
+        self.client.force_login(self.author)
+        self.assertEqual(self.feed('rss')['ETag'], response['ETag'])
+
+    def test_queries_counted_in_budget(self):
+        """Запросы к базе заканчиваются до потоковой отдачи ленты."""
+        url = reverse('posts:group_feed', args=[GROUP_SLUG, 'rss'])
+        budget = resolve(url).func.query_budget
+        with assert_max_queries(budget, url) as statements:
+            response = self.client.get(url)
+            executed = len(statements)
+            self.read(response)
+        self.assertEqual(len(statements), executed)
+
+    def test_control_characters_stripped(self):
+        Post.objects.filter(pk=self.post.pk).update(text='Звонок\x07 \x1b[0m')
+        for fmt in ('rss', 'atom'):
+            with self.subTest(fmt=fmt):
+                body = self.read(self.feed(fmt))
+                self.assertIn('Звонок [0m', body)
+                self.assertNotRegex(body, '[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_and_bench(self):
+        """Набор воспроизводим, а замер пишет JSON по всем лентам."""
+        call_command(
+            'seed_data', '--users', '20', '--posts', '60', '--comments',
+            '80', '--groups', '2', '--follows', '5', '--seed', '3',
+            stdout=StringIO(),
+        )
+        texts = list(Post.objects.values_list('text', flat=True)[:5])
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 60)
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'bench_views', '--repeat', '2', '--deep-page', '2',
+                '--output', output.name, stdout=StringIO(),
+            )
+            report = json.load(output)
+        self.assertEqual(
+            {row['view'] for row in report['results']},
+            {'index', 'group_posts', 'profile', 'post_detail',
+             'follow_index'},
+        )
+        self.assertTrue(all(
+            {'p50_ms', 'p99_ms', 'queries', 'peak_kb'} <= set(row)
+            for row in report['results']
+        ))
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        call_command(
+            'seed_data', '--users', '20', '--posts', '60', '--comments',
+            '80', '--groups', '2', '--follows', '5', '--seed', '3',
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)[:5]), texts
+        )
+
+
+class CommentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=TEST_AUTOR)
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.other = Post.objects.create(author=cls.author, text='Другой')
+        Comment.objects.create(
+            post=cls.other, author=cls.author, text='чужой'
+        )
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'comment {i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        )
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+        cls.comments_url = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.pk}
+        )
+
+    def test_post_detail_shows_first_page_of_own_comments(self):
+        comments = self.client.get(self.url).context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+        self.assertTrue(all(c.post_id == self.post.pk for c in comments))
+
+    def test_older_comments_fragment_and_json(self):
+        first = self.client.get(self.url).context['comments']
+        cursor = first.next_cursor()
+        response = self.client.get(self.comments_url, {'cursor': cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertFalse(set(first) & set(rest))
+        data = self.client.get(
+            self.comments_url, {'cursor': cursor, 'format': 'json'}
+        ).json()
+        self.assertEqual(
+            [row['id'] for row in data['comments']], [c.pk for c in rest]
+        )
+        self.assertIsNone(data['next'])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=TEST_AUTOR)
+        cls.post = Post.objects.create(
+            author=cls.author, text='Весенний поход в горы'
+        )
+        cls.other = Post.objects.create(
+            author=cls.author, text='Горы, горы и ещё раз горы'
+        )
+        Post.objects.create(author=cls.author, text='Рецепт пирога')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_ranked_results(self):
+        """Ищет по словам и префиксу, более релевантные посты выше."""
+        self.assertEqual(self.search('горы'), [self.other, self.post])
+        self.assertEqual(self.search('весен'), [self.post])
+        self.assertEqual(self.search('ПОХОД горы'), [self.post])
+
+    def test_index_follows_edits_and_deletes(self):
+        Post.objects.filter(pk=self.post.pk).update(text='Осенний лес')
+        self.assertEqual(self.search('поход'), [])
+        self.assertEqual(self.search('лес'), [self.post])
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(self.search('лес'), [])
+
+    def test_pages_without_count(self):
+        """Страницы идут по номеру, ранжируются только свежие совпадения."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Горы {i}')
+            for i in range(COUNT_POST_FOR_PAGE)
+        )
+        first = self.client.get(reverse('posts:search'), {'q': 'горы'})
+        self.assertTrue(first.context['page_obj'].has_next())
+        self.assertNotContains(first, 'Найдено записей')
+        second = self.client.get(
+            reverse('posts:search'), {'q': 'горы', 'page': 2}
+        )
+        self.assertEqual(len(second.context['page_obj']), 2)
+        self.assertFalse(second.context['page_obj'].has_next())
+        with mock.patch.object(search, 'MAX_RESULTS', 3):
+            self.assertEqual(len(search.SearchResults('горы')[:10]), 3)
+
+    def test_fts_syntax_is_escaped(self):
+        for query in ('"', 'AND OR', 'text:*', 'NEAR(', '', '^'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query}
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'пирог'}
+            )
+        self.assertEqual(response.context['cl'].result_count, 1)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
+
 
 class PostFormTests(PostForm):
     @classmethod
@@ -473,3 +1141,224 @@ class FollowTests(TestCase):
         response = self.client_auth_following.get('/follow/')
         self.assertNotContains(response,
                                'Тестовая запись для тестирования ленты')
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост автора сразу попадает в материализованную ленту."""
+        Follow.objects.create(user=self.user_follower,
+                              author=self.user_following)
+        new_post = Post.objects.create(author=self.user_following,
+                                       text='Свежая запись')
+        response = self.client_auth_follower.get('/follow/')
+        self.assertEqual(response.context['page_obj'][0], new_post)
+        self.assertEqual(
+            Timeline.objects.filter(user=self.user_follower).count(), 2
+        )
+
+    def test_unfollow_prunes_timeline(self):
+        """После отписки записи автора удаляются из ленты."""
+        Follow.objects.create(user=self.user_follower,
+                              author=self.user_following)
+        self.client_auth_follower.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.user_following.username}))
+        self.assertFalse(
+            Timeline.objects.filter(user=self.user_follower).exists()
+        )
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты."""
+        Follow.objects.create(user=self.user_follower,
+                              author=self.user_following)
+        Timeline.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(Timeline.objects.values_list('user', 'post')),
+            [(self.user_follower.pk, self.post.pk)]
+        )
+
+
+class SuggestionsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'writer', 'fan', 'lonely')
+        }
+        for user, author in (
+            ('reader', 'friend'), ('friend', 'writer'), ('fan', 'friend'),
+            ('fan', 'writer'),
+        ):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author]
+            )
+
+    def setUp(self):
+        cache.clear()
+        suggestions.build()
+        self.client.force_login(self.users['reader'])
+
+    def test_friends_of_friends_suggested(self):
+        """Автор, которого читают мои авторы, попадает в рекомендации."""
+        suggested = Suggestion.objects.filter(user=self.users['reader'])
+        self.assertEqual(
+            [item.author for item in suggested], [self.users['writer']]
+        )
+        self.assertFalse(
+            Suggestion.objects.filter(user=self.users['fan']).exists()
+        )
+
+    def test_suggestions_shown_on_pages(self):
+        for url in (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=['lonely']),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    [item.author for item in response.context['suggestions']],
+                    [self.users['writer']],
+                )
+
+    def test_follow_removes_suggestion(self):
+        self.client.get(reverse('posts:profile_follow', args=['writer']))
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['suggestions']), [])
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=TEST_AUTOR)
+        cls.quiet = Post.objects.create(author=cls.author, text='Тихий')
+        cls.discussed = Post.objects.create(author=cls.author, text='Спор')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_raise_post(self):
+        """Обсуждаемый пост обгоняет более свежий, но тихий."""
+        Comment.objects.create(
+            post=self.discussed, author=self.author, text='Ответ'
+        )
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(
+            list(response.context['page_obj']), [self.discussed, self.quiet]
+        )
+
+    def test_decay(self):
+        """Оценки угасают, угасшие посты выпадают из ленты."""
+        first = trending.decay(now=0)
+        factor = trending.decay(now=settings.TRENDING_HALF_LIFE)
+        self.assertAlmostEqual(factor, 0.5)
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(post=self.quiet).score,
+            settings.TRENDING_POST_WEIGHT * first / 2,
+        )
+        trending.decay(now=settings.TRENDING_HALF_LIFE * 20)
+        self.assertFalse(TrendingScore.objects.exists())
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_rebuild_matches_incremental(self):
+        Comment.objects.create(
+            post=self.discussed, author=self.author, text='Ответ'
+        )
+        incremental = dict(
+            TrendingScore.objects.values_list('post_id', 'score')
+        )
+        trending.rebuild()
+        rebuilt = dict(TrendingScore.objects.values_list('post_id', 'score'))
+        self.assertEqual(incremental.keys(), rebuilt.keys())
+        for post_id, score in incremental.items():
+            self.assertAlmostEqual(rebuilt[post_id], score, places=3)
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """Почтовый бэкенд, который падает на адресе flaky@, пока failing."""
+    failing = False
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.failing and 'flaky@yatube.ru' in message.to:
+                raise SMTPServerDisconnected('Соединение разорвано')
+        return super().send_messages(messages)
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=TEST_AUTOR)
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@yatube.ru'
+        )
+        cls.no_email = User.objects.create_user(username='no_email')
+        for user in (cls.reader, cls.no_email):
+            Follow.objects.create(user=user, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def publish(self, text):
+        self.client.post(CREATE_POST_URL, {'text': text})
+        # Рассылка отложена на интервал дайджеста: burst её не трогает
+        call_command(
+            'run_workers', queues=['default'], burst=True, stdout=StringIO()
+        )
+
+    def test_posts_collected_into_one_digest(self):
+        """Несколько постов уходят подписчику одним письмом, один раз."""
+        self.publish('Первый пост')
+        self.publish('Второй пост')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            Job.objects.filter(
+                task='posts.notifications.send_digests', status=Job.QUEUED,
+            ).count(),
+            1,
+        )
+        self.assertEqual(notifications.send_digests(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['reader@yatube.ru'])
+        self.assertIn('Первый пост', message.body)
+        self.assertIn('Второй пост', message.body)
+        # Повторный запуск не шлёт отправленное ещё раз
+        self.assertEqual(notifications.send_digests(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_fan_out_rerun_is_idempotent(self):
+        self.publish('Пост')
+        post = Post.objects.get(text='Пост')
+        self.assertEqual(notifications.fan_out(post.pk), 1)
+        self.assertEqual(
+            list(Notification.objects.values_list('recipient', flat=True)),
+            [self.reader.pk],
+        )
+
+    @override_settings(
+        EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+        QUEUED_EMAIL_BACKEND='posts.tests.test_views.FlakyEmailBackend',
+    )
+    def test_failed_digest_resends_only_undelivered(self):
+        """После сбоя повтор отправляет только не ушедшие письма."""
+        flaky = User.objects.create_user(
+            username='flaky', email='flaky@yatube.ru'
+        )
+        Follow.objects.create(user=flaky, author=self.author)
+        self.publish('Пост')
+        FlakyEmailBackend.failing = True
+        try:
+            with self.assertRaises(SMTPServerDisconnected):
+                notifications.send_digests()
+        finally:
+            FlakyEmailBackend.failing = False
+        self.assertEqual(
+            [message.to for message in mail.outbox], [['reader@yatube.ru']]
+        )
+        self.assertEqual(notifications.send_digests(), 1)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [['reader@yatube.ru'], ['flaky@yatube.ru']],
+        )
+        # Дайджесты уходят из задачи напрямую, не через очередь mail
+        self.assertFalse(Job.objects.filter(queue='mail').exists())
@@ -0,0 +1,80 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Шаблоны не создают миниатюры сами: тег cached_thumbnail только ищет
+готовую и, если её ещё нет, выводит заглушку. После сохранения поста
+с новой картинкой миниатюры всех размеров из SIZES строит задача в
+очереди thumbnails (core.jobs); для старых постов есть команда
+generate_thumbnails.
+"""
+from sorl.thumbnail import base, default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import jobs
+
+from . import cache, cards
+from .models import Post
+
+# Все размеры, которые используют шаблоны: псевдоним -> (геометрия, опции)
+SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    """Бэкенд sorl с поиском миниатюры без её генерации."""
+
+    def _prepare_options(self, source, options):
+        # Та же подготовка опций, что и в get_thumbnail, чтобы имя
+        # файла миниатюры совпало
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None, если её ещё не построили."""
+        source = ImageFile(file_)
+        options = self._prepare_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def lookup(image, alias):
+    geometry, options = SIZES[alias]
+    return default.backend.lookup(image, geometry, **options)
+
+
+def generate(name):
+    """Строит миниатюры всех размеров для файла картинки."""
+    for geometry, options in SIZES.values():
+        default.backend.get_thumbnail(name, geometry, **options)
+
+
+def build(post):
+    """Строит миниатюры поста и сбрасывает кэш страниц с заглушкой."""
+    generate(post.image.name)
+    cards.forget(post.pk)
+    cache.invalidate_post(post, post.group_id)
+
+
+@jobs.task(queue='thumbnails')
+def build_thumbnails(post_id, name):
+    post = Post.objects.filter(pk=post_id).first()
+    # Картинку успели сменить или удалить пост: строить нечего, новую
+    # картинку обработает своя задача
+    if post is None or post.image.name != name:
+        return
+    build(post)
+
+
+def schedule(post):
+    """Ставит генерацию миниатюр поста в очередь в текущей транзакции."""
+    if post.image.name:
+        jobs.enqueue(build_thumbnails, post.pk, post.image.name)
@@ -0,0 +1,104 @@
+"""Поддержка материализованной ленты подписок (fan-out on write)."""
+from django.db import transaction
+
+from .models import Follow, Post, Timeline
+
+BATCH_SIZE = 1000
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).iterator()
+    entries = (
+        Timeline(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in follower_ids
+    )
+    _bulk_insert(entries)
+
+
+def fan_out_posts(posts):
+    """Раскладывает пачку новых постов в ленты подписчиков их авторов."""
+    followers = {}
+    follows = Follow.objects.filter(
+        author_id__in={post.author_id for post in posts}
+    ).values_list('author_id', 'user_id')
+    for author_id, user_id in follows.iterator():
+        followers.setdefault(author_id, []).append(user_id)
+    entries = (
+        Timeline(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for post in posts
+        for user_id in followers.get(post.author_id, ())
+    )
+    return _bulk_insert(entries)
+
+
+def backfill_follows(pairs):
+    """Добавляет в ленты посты авторов из пар (подписчик, автор)."""
+    readers = {}
+    for user_id, author_id in pairs:
+        readers.setdefault(author_id, []).append(user_id)
+    posts = Post.objects.filter(author_id__in=readers).values_list(
+        'author_id', 'pk', 'pub_date'
+    )
+    entries = (
+        Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for author_id, pk, pub_date in posts.iterator()
+        for user_id in readers[author_id]
+    )
+    return _bulk_insert(entries)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты нового автора."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    ).iterator()
+    entries = (
+        Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts
+    )
+    _bulk_insert(entries)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора, от которого он отписался."""
+    Timeline.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user_ids=None):
+    """Пересобирает ленты целиком; возвращает число записей."""
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+    with transaction.atomic():
+        stale = Timeline.objects.all()
+        if user_ids is not None:
+            stale = stale.filter(user_id__in=user_ids)
+        stale.delete()
+        rows = follows.filter(author__posts__isnull=False).values_list(
+            'user_id', 'author__posts__pk', 'author__posts__pub_date'
+        )
+        entries = (
+            Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for user_id, pk, pub_date in rows.iterator()
+        )
+        return _bulk_insert(entries)
+
+
+def _bulk_insert(entries):
+    created = 0
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+            batch = []
+    if batch:
+        Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+        created += len(batch)
+    return created
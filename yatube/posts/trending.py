@@ -0,0 +1,113 @@
+"""Лента популярного: оценки постов, поддерживаемые при записи.
+
+Новый пост получает TRENDING_POST_WEIGHT, каждый комментарий добавляет
+TRENDING_COMMENT_WEIGHT — одним UPDATE по первичному ключу, без
+агрегатов по Comment. Команда decay_trending раз в
+TRENDING_DECAY_INTERVAL умножает все оценки на 2^(-t/TRENDING_HALF_LIFE),
+где t — время с прошлого запуска, и удаляет угасшие строки, так что
+таблица остаётся маленькой, а свежие обсуждения обгоняют старые.
+
+Страница популярного кэшируется в областях index и trending. Версию
+trending сбрасывает только decay, поэтому комментарии не сбрасывают
+кэш на каждой записи, а меняют порядок в ленте не позже следующего
+decay; новые и изменённые посты сбрасывают index, как и везде.
+"""
+import math
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import cache
+from .models import Comment, Post, TrendingScore
+
+# Ниже этой оценки пост выпадает из таблицы
+MIN_SCORE = 0.05
+SCOPE = 'trending'
+_DECAYED_KEY = 'posts:trending:decayed'
+
+
+def decay_factor(seconds):
+    return 0.5 ** (seconds / settings.TRENDING_HALF_LIFE)
+
+
+def post_created(post):
+    TrendingScore.objects.create(
+        post=post, score=settings.TRENDING_POST_WEIGHT
+    )
+
+
+def comment_added(post_id):
+    scores = TrendingScore.objects.filter(post_id=post_id)
+    weight = settings.TRENDING_COMMENT_WEIGHT
+    if not scores.update(score=F('score') + weight):
+        # Пост уже выпал из таблицы: комментарий возвращает его
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(post_id=post_id, score=weight)],
+            ignore_conflicts=True,
+        )
+
+
+def decay(now=None):
+    """Применяет затухание с прошлого запуска; возвращает множитель."""
+    now = time.time() if now is None else now
+    last = django_cache.get(_DECAYED_KEY)
+    # Если отметка потерялась, считаем, что запуск был по расписанию
+    elapsed = (
+        now - last if last is not None
+        else settings.TRENDING_DECAY_INTERVAL
+    )
+    factor = decay_factor(max(elapsed, 0))
+    with transaction.atomic():
+        TrendingScore.objects.update(score=F('score') * factor)
+        TrendingScore.objects.filter(score__lt=MIN_SCORE).delete()
+    django_cache.set(_DECAYED_KEY, now, None)
+    cache.invalidate(SCOPE)
+    return factor
+
+
+def rebuild():
+    """Пересчитывает оценки с нуля по постам и комментариям.
+
+    Нужна после массовой загрузки: bulk_create не посылает сигналы.
+    Смотрит только на окно, за которое оценка падает ниже MIN_SCORE.
+    """
+    now = timezone.now()
+    heaviest = max(
+        settings.TRENDING_POST_WEIGHT, settings.TRENDING_COMMENT_WEIGHT
+    )
+    window = timedelta(seconds=settings.TRENDING_HALF_LIFE * math.log2(
+        heaviest / MIN_SCORE
+    ))
+    scores = {}
+    recent = Post.objects.filter(pub_date__gte=now - window)
+    for post_id, pub_date in recent.values_list('pk', 'pub_date').iterator():
+        age = (now - pub_date).total_seconds()
+        scores[post_id] = settings.TRENDING_POST_WEIGHT * decay_factor(age)
+    comments = Comment.objects.filter(created__gte=now - window)
+    for post_id, created in comments.values_list(
+            'post_id', 'created').iterator():
+        age = (now - created).total_seconds()
+        scores[post_id] = (
+            scores.get(post_id, 0)
+            + settings.TRENDING_COMMENT_WEIGHT * decay_factor(age)
+        )
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            TrendingScore(post_id=post_id, score=score)
+            for post_id, score in scores.items() if score >= MIN_SCORE
+        )
+    django_cache.set(_DECAYED_KEY, time.time(), None)
+    cache.invalidate(SCOPE)
+
+
+def top(limit=None):
+    """Самые популярные посты: проход по индексу оценок."""
+    return Post.objects.filter(trending__isnull=False).select_related(
+        'author', 'group'
+    ).order_by('-trending__score')[:limit or settings.TRENDING_SIZE]
@@ -10,11 +10,25 @@ urlpatterns = [
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'posts/<int:post_id>/comments/', views.post_comments,
+        name='post_comments'
+    ),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/feed/<str:fmt>/', views.group_feed,
+        name='group_feed'
+    ),
+    path(
+        'profile/<str:username>/feed/<str:fmt>/', views.profile_feed,
+        name='profile_feed'
+    ),
     path('create/', views.post_create, name='post_create'),
     path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
+    path('trending/', views.trending_posts, name='trending'),
         path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/', 
@@ -24,5 +38,6 @@ urlpatterns = [
         'profile/<str:username>/unfollow/',
         views.profile_unfollow,
         name='profile_unfollow'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
 
 ]
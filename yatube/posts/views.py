@@ -1,25 +1,39 @@
 """Файл для отправки и отображения информации из баз в шаблоны."""
 from datetime import datetime
 
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
 from posts.forms import PostForm, CommentForm
 from django.urls import reverse
-from django.views.decorators.cache import cache_page
 
-from .models import Follow, Group, Post, User, Comment
+from core.query_budget import query_budget
+from core.ratelimit import rate_limit
+from core.replicas import read_replica
 
-from yatube.settings import COUNT_POST_FOR_PAGE
+from .cache import (STATS, conditional_page, group_scope, index_scope,
+                    post_detail_scopes, profile_scope, versioned_cache_page)
+from . import suggestions, trending
+from .counters import get_stats
+from .feeds import FORMATS, feed_response
+from .models import Comment, Follow, Group, Post, Timeline, User
+from .paginator import paginate
+from .search import SearchResults
+from yatube.settings import (COMMENTS_PER_PAGE, COUNT_POST_FOR_PAGE,
+                             TRENDING_DECAY_INTERVAL)
 
-@cache_page(60 * 15, key_prefix='index_page')
+
+@read_replica
+@conditional_page(lambda: [index_scope()])
+@versioned_cache_page(lambda: [index_scope()])
+@query_budget(3)
 def index(request):
     """Метод для отображения информации  на главной странице."""
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, COUNT_POST_FOR_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = paginate(request, post_list)
     context = {
         'posts': post_list,
         'year': datetime.now().year,
@@ -28,13 +42,15 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@read_replica
+@conditional_page(lambda slug: [group_scope(slug)])
+@versioned_cache_page(lambda slug: [group_scope(slug)])
+@query_budget(4)
 def group_posts(request, slug):
     """Метод для отображения всех других страниц кроме главной."""
     group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, COUNT_POST_FOR_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.select_related('author', 'group')
+    page_obj = paginate(request, post_list)
 
     context = {
         'post_list': post_list,
@@ -44,46 +60,142 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@read_replica
+@conditional_page(lambda username: [profile_scope(username)])
+@versioned_cache_page(lambda username: [profile_scope(username)])
+@query_budget(7)
 def profile(request, username):
     user = get_object_or_404(User, username=username)
-    posts = (
-        Post.objects.filter(author__username=username)
+    posts = user.posts.select_related('group')
+    page_obj = paginate(request, posts)
+    stats = get_stats(user.pk)
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(user=request.user, author=user).exists()
     )
-    paginator = Paginator(posts, COUNT_POST_FOR_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
     context = {
         'posts': posts,
         'page_obj': page_obj,
         'author': user,
+        'stats': stats,
+        'posts_count': stats.posts_count,
+        'following': following,
+        'suggestions': suggestions.for_user(request.user),
     }
     return render(request, 'posts/profile.html', context)
 
 
-def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    post_count = Post.objects.select_related('author').filter(
-        author=post.author).count()
+@read_replica
+@conditional_page(lambda: [index_scope(), trending.SCOPE])
+@versioned_cache_page(
+    lambda: [index_scope(), trending.SCOPE],
+    timeout=TRENDING_DECAY_INTERVAL,
+)
+@query_budget(3)
+def trending_posts(request):
+    """Популярные посты: свежие и активно обсуждаемые."""
+    context = {'page_obj': trending.top()}
+    return render(request, 'posts/trending.html', context)
+
+
+@read_replica
+@versioned_cache_page(lambda: [index_scope()])
+@query_budget(5)
+def search(request):
+    """Поиск по тексту постов, результаты по релевантности."""
+    query = request.GET.get('q', '').strip()
+    page_obj = SearchResults(query).page(
+        request.GET.get('page'), COUNT_POST_FOR_PAGE
+    )
     context = {
-        'post': post,
-        'post_count': post_count,
+        'query': query,
+        'page_obj': page_obj,
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render(request, 'posts/search.html', context)
+
+
+def _comments_page(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    return paginate(request, comments, COMMENTS_PER_PAGE, field='created')
+
+
+@read_replica
+@conditional_page(lambda slug, fmt: [group_scope(slug)], public=True)
+@query_budget(3)
+def group_feed(request, slug, fmt):
+    """Лента последних постов группы в формате RSS, Atom или JSON."""
+    if fmt not in FORMATS:
+        raise Http404
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(
+        request, fmt, group.title,
+        reverse('posts:group_list', args=[slug]),
+        group.posts.all(), [group_scope(slug)],
+    )
+
+
+@read_replica
+@conditional_page(
+    lambda username, fmt: [profile_scope(username)], public=True
+)
+@query_budget(3)
+def profile_feed(request, username, fmt):
+    """Лента последних постов автора в формате RSS, Atom или JSON."""
+    if fmt not in FORMATS:
+        raise Http404
+    author = get_object_or_404(User, username=username)
+    return feed_response(
+        request, fmt, author.get_full_name() or author.username,
+        reverse('posts:profile', args=[username]),
+        author.posts.all(), [profile_scope(username)],
+    )
 
 
+@read_replica
+@conditional_page(post_detail_scopes)
+@query_budget(6)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     form = CommentForm()
-    comments = Comment.objects.all()
     context = {
         'post': post,
+        'post_count': get_stats(post.author_id).posts_count,
         'form': form,
-        'comments': comments,
+        'comments': _comments_page(request, post_id),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@read_replica
+@query_budget(4)
+def post_comments(request, post_id):
+    """Следующая страница комментариев: HTML-фрагмент или JSON."""
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    page_obj = _comments_page(request, post.pk)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in page_obj
+            ],
+            'next': page_obj.next_cursor(),
+        })
+    context = {'post': post, 'comments': page_obj, 'page_obj': page_obj}
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
+@rate_limit('post_create')
+@query_budget(3)
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -94,42 +206,27 @@ def post_create(request):
         if form.is_valid():
             new_post = form.save(commit=False)
             new_post.author = request.user
-            new_post.save()
+            with transaction.atomic():
+                new_post.save()
             return redirect('posts:profile', request.user)
 
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@rate_limit('post_edit')
+@query_budget(4)
 def post_edit(request, post_id):
-    post_list = Post.objects.all()
     post = get_object_or_404(Post, id=post_id, author=request.user)
     form = PostForm(
-        request.POST,
-        files=request.FILES or None,
-        instance=post
-    )
-    if request.method == 'GET':
-        return render(request, 'posts/create_post.html',
-                      {'post_list': post_list,
-                       'post': post,
-                       'is_edit': True,
-                       'form': form,
-                       'post_id': post_id,
-                       })
-    form = PostForm(
-        request.POST,
+        request.POST or None,
         files=request.FILES or None,
         instance=post
     )
     if request.method == 'POST':
-        form = PostForm(
-            request.POST,
-            files=request.FILES or None,
-            instance=post
-        )
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
         return redirect('posts:post_detail', post_id=post.pk)
     context = {'post_id': post_id,
                'form': form,
@@ -140,6 +237,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@rate_limit('add_comment')
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -147,26 +245,37 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id)
 
 
+@read_replica
 @login_required
+@query_budget(4)
 def follow_index(request):
-    list_of_posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(list_of_posts, COUNT_POST_FOR_PAGE)
-    page_namber = request.GET.get('page')
-    page_obj = paginator.get_page(page_namber)
-    context = {'page_obj': page_obj}
+    entries = Timeline.objects.filter(user=request.user).select_related(
+        'post__author', 'post__group'
+    )
+    page_obj = paginate(
+        request, entries, pk_field='post_id',
+        transform=lambda rows: [entry.post for entry in rows],
+    )
+    context = {
+        'page_obj': page_obj,
+        'suggestions': suggestions.for_user(request.user),
+    }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@rate_limit('follow', methods=('GET', 'POST'))
 def profile_follow(request, username):
     user=request.user
     author=User.objects.get(username=username)
     if user != author:
-        Follow.objects.get_or_create(user=user, author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=user, author=author)
     return redirect('posts:profile', username)
 # def profile_follow(request, username):
 #     user = request.user
@@ -178,9 +287,22 @@ def profile_follow(request, username):
 
 
 @login_required
+@rate_limit('follow', methods=('GET', 'POST'))
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     is_follower = Follow.objects.filter(user=request.user, author=author)
     if is_follower.exists():
-        is_follower.delete()
-    return redirect('posts:profile', username=author)
\ No newline at end of file
+        with transaction.atomic():
+            is_follower.delete()
+    return redirect('posts:profile', username=author)
+
+
+@staff_member_required
+def cache_stats(request):
+    """Счётчики кэша страниц и карточек постов в этом процессе."""
+    stats = dict.fromkeys((
+        'hits', 'misses', 'invalidations', 'not_modified',
+        'card_hits', 'card_misses',
+    ), 0)
+    stats.update(STATS)
+    return JsonResponse(stats)
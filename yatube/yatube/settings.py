@@ -9,6 +9,39 @@ SECRET_KEY = 'kxl1@z$!35bn0+r2)p%8h@ik@$^4$*x-9fhr2^355!=%#$34d%'
 
 COUNT_POST_FOR_PAGE = 10
 
+# Доступ к /metrics: если задан токен, Prometheus передаёт его в
+# Authorization: Bearer; без токена — только прямые запросы с этих
+# адресов (запросы через обратный прокси отклоняются)
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Число последних постов в лентах RSS/Atom/JSON
+FEED_SIZE = 50
+# Сколько секунд прокси и агрегаторы могут не перепроверять ленту
+FEED_MAX_AGE = 5 * 60
+
+# Комментарии под постом: первая страница сразу, остальные по запросу
+COMMENTS_PER_PAGE = 20
+
+# Лента популярного (posts/trending.py): вклад поста и комментария,
+# период полураспада оценки и как часто запускается decay_trending
+TRENDING_POST_WEIGHT = 3.0
+TRENDING_COMMENT_WEIGHT = 1.0
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_DECAY_INTERVAL = 10 * 60
+TRENDING_SIZE = 50
+
+# Лимиты пишущих view на пользователя (core/ratelimit.py)
+RATE_LIMITS = {
+    'post_create': '10/m',
+    'post_edit': '30/m',
+    'add_comment': '20/m',
+    'follow': '60/m',
+}
+
+# Страницы инвалидируются сигналами, поэтому срок жизни кэша большой
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
 DEBUG = True
 
 ALLOWED_HOSTS = [
@@ -34,12 +67,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы замер включал все остальные middleware
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.replicas.ReplicaPinMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -47,7 +83,8 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки для /metrics
+        'BACKEND': 'core.metrics.InstrumentedDjangoTemplates',
 
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
 
@@ -65,11 +102,45 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Боевой режим SQLite: прагмы SQLITE_PRAGMAS и постоянные соединения
+SQLITE_PRODUCTION = os.environ.get('YATUBE_SQLITE_PRODUCTION') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Отдельная база для замеров: YATUBE_DATABASE=/tmp/bench.sqlite3
+        'NAME': os.environ.get('YATUBE_DATABASE',
+                               os.path.join(BASE_DIR, 'db.sqlite3')),
+        # В боевом режиме соединение живёт между запросами
+        'CONN_MAX_AGE': int(os.environ.get(
+            'YATUBE_CONN_MAX_AGE', 600 if SQLITE_PRODUCTION else 0
+        )),
+    }
+}
+
+# Реплики для чтения лент (core/replicas.py): пути через запятую.
+# Локально это копии основной базы, обновляемые sync_replicas.
+for index, name in enumerate(filter(None, os.environ.get(
+    'YATUBE_DATABASE_REPLICAS', ''
+).split(','))):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'], 'NAME': name, 'TEST': {'MIRROR': 'default'},
     }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи клиент читает из основной базы
+REPLICA_PIN_SECONDS = 10
+
+# Выполняются на каждом новом соединении с SQLite в боевом режиме
+# (SQLITE_PRODUCTION, core/sqlite.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    # Отрицательное значение — в КБ: 64 МБ страничного кэша на соединение
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -109,7 +180,7 @@ LOGIN_REDIRECT_URL = 'posts:index'
 
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -119,10 +190,55 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий для всех воркеров кэш в файле SQLite (см. core/cache.py).
+# Для кэша внутри одного процесса можно вернуть
+# 'django.core.cache.backends.locmem.LocMemCache'.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': os.environ.get('YATUBE_CACHE_BACKEND',
+                                  'core.cache.SQLiteCache'),
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION',
+                                   os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 128 * 1024 * 1024,
+        },
     }
 }
 
+# Тесты получают свой кэш во временном файле (core/runner.py)
+TEST_RUNNER = 'core.runner.TestRunner'
+
+# Приём картинок постов (posts/images.py)
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_QUALITY = 82
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+
+# Миниатюры строятся в фоне (posts/thumbnails.py)
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+THUMBNAIL_WORKERS = os.cpu_count() or 1
+
+# Фоновые задачи (core/jobs.py): очередь -> число процессов run_workers
+JOB_QUEUES = {
+    'default': 2,
+    'thumbnails': THUMBNAIL_WORKERS,
+    'mail': 1,
+}
+JOB_POLL_INTERVAL = 1.0
+# Первая задержка повтора; дальше удваивается
+JOB_RETRY_DELAY = 10
+# Задача дольше этого считается брошенной и возвращается в очередь
+JOB_TIMEOUT = 10 * 60
+JOB_KEEP_DONE = 24 * 60 * 60
+
+# Письма уходят через очередь mail, а отправляет их этот бэкенд
+QUEUED_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+
+# Уведомления о новых постах (posts/notifications.py) копятся и уходят
+# одним письмом на подписчика не чаще раза в этот интервал
+NOTIFICATION_DIGEST_INTERVAL = 60 * 60
+# Адрес сайта для ссылок в письмах
+SITE_URL = os.environ.get('YATUBE_SITE_URL', 'http://127.0.0.1:8000')
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -4,10 +4,14 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core import views as core_views
+
 app_name = 'yatube'
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', core_views.metrics, name='metrics'),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),